@@ -3,25 +3,110 @@ import json
 import re
 from dotenv import load_dotenv
 from flask import jsonify
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam, String
 import google.generativeai as genai
 from difflib import get_close_matches
 import os
-from threading import Thread
-import pandas as pd
+from threading import Thread, Lock, Event, local
+from concurrent.futures import ThreadPoolExecutor
 import time
-import datetime
+from collections import OrderedDict
+from cache import TranslationCache, ResultCache
+from sql_templates import SqlTemplateStore
+from formatting import format_rows
+from result_store import ResultStore
+from charts import build_time_series_chart, build_category_chart
+from exporter import EXPORT_FORMATS, normalize_export_format, write_export
+from export_registry import ExportJobRegistry, InsightJobRegistry
 
-export_jobs = {}
+# Most recent parameterized statement shapes remembered for the plan stats
+PLAN_SHAPES_TRACKED = 4096
+
+# Per-request stage timings (prompt build, LLM, SQL, ...) of the thread running ask()
+_request_timings = local()
+
+class QueryCancelled(Exception):
+    """Raised inside a SQL worker when its (speculative) query was cancelled."""
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise QueryCancelled()
+
+
+class StreamingSqlExtractor:
+    """
+    Incremental reader for the streamed LLM JSON envelope.
+    feed() returns the decoded "sql_query" string as soon as its closing
+    quote has arrived (once), otherwise None.
+    """
 
-class QueryAgent:
     def __init__(self):
+        self.buffer = ""
+        self.value_start = None  # index right after the opening quote
+        self.scan_pos = 0
+        self.escaped = False
+        self.done = False
+
+    def feed(self, text):
+        if self.done:
+            return None
+        self.buffer += text
+
+        if self.value_start is None:
+            match = re.search(r'"sql_query"\s*:\s*"', self.buffer)
+            if not match:
+                return None
+            self.value_start = self.scan_pos = match.end()
+
+        # Scan for the first unescaped closing quote
+        for i in range(self.scan_pos, len(self.buffer)):
+            ch = self.buffer[i]
+            if self.escaped:
+                self.escaped = False
+            elif ch == "\\":
+                self.escaped = True
+            elif ch == '"':
+                self.done = True
+                raw_value = self.buffer[self.value_start:i]
+                try:
+                    return json.loads(f'"{raw_value}"')
+                except ValueError:
+                    return None
+        self.scan_pos = len(self.buffer)
+        return None
+
+
+class SpeculativeQuery:
+    """Handle for a SQL execution started before the LLM response was complete."""
+
+    def __init__(self, sql_query):
+        self.sql_query = sql_query
+        self.cancel_event = Event()
+        self.future = None
+
+    def result(self):
+        return self.future.result()
+
+    def cancel(self):
+        """Abandons the speculative work; running SQL workers stop at their next checkpoint."""
+        self.cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class QueryAgent:
+    def __init__(self, model=None, engine=None):
         """
         Initializes the QueryAgent by:
         1. Loading environment variables.
         2. Configuring the Google Generative AI (Gemini) client.
         3. Creating a SQLAlchemy engine for the SQL Server DB.
         4. Fetching the database schema to be used in the prompt.
+        5. Setting up the performance caches and SQL worker pool.
+
+        A model and/or engine can be passed in (e.g. by the benchmark harness)
+        to run against a fake Gemini model or a local database instead.
         """
         # ============================================================
         # SECTION 1: Load Environment Variables
@@ -32,9 +117,10 @@ class QueryAgent:
         # SECTION 2: Configure Google Generative AI (Gemini)
         # ============================================================
         google_api_key = os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
+        if model is None and not google_api_key:
             raise ValueError("GOOGLE_API_KEY not found in .env file")
-        genai.configure(api_key=google_api_key)
+        if google_api_key:
+            genai.configure(api_key=google_api_key)
         
         # Set model parameters for consistent, safe responses
         generation_config = {
@@ -53,7 +139,7 @@ class QueryAgent:
         ]
         
         # Initialize the Gemini model
-        self.model = genai.GenerativeModel(
+        self.model = model if model is not None else genai.GenerativeModel(
             model_name="gemini-2.5-flash",
             generation_config=generation_config,
             safety_settings=safety_settings
@@ -77,7 +163,7 @@ class QueryAgent:
 
         # Test database connection
         try:
-            self.engine = create_engine(conn_string)
+            self.engine = engine if engine is not None else create_engine(conn_string)
             with self.engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
             print("--- Database Connection Successful ---")
@@ -100,6 +186,109 @@ class QueryAgent:
         self.schema = self._get_db_schema(self.relevant_tables)
         print(f"--- Schema Loaded ---\n{self.schema}\n-----------------------")
 
+        # ============================================================
+        # SECTION 5: Performance Caches & Query Workers
+        # ============================================================
+
+        # Exact-match NL -> SQL translation cache (skips the Gemini call
+        # for repeated questions with the same recent history)
+        self.translation_cache = TranslationCache(
+            max_entries=int(os.getenv("TRANSLATION_CACHE_SIZE", "512")),
+            ttl_seconds=int(os.getenv("TRANSLATION_CACHE_TTL", "3600")),
+            history_turns=int(os.getenv("TRANSLATION_CACHE_HISTORY_TURNS", "2")),
+        )
+
+        # SQL result cache (formatted rows + summary stats), invalidated
+        # when MAX(BE_Date)/MAX(SB_Date) of the source view advances
+        self.result_cache = ResultCache(
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+        )
+        self.watermark_check_interval = int(os.getenv("RESULT_CACHE_WATERMARK_INTERVAL", "60"))
+        self._watermarks = {}  # table -> (checked_at, MAX(date))
+        self._watermark_lock = Lock()
+
+        # Worker pool for running independent SQL statements concurrently
+        # (each task checks out its own connection from the engine's pool)
+        self.query_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("DB_QUERY_WORKERS", "8")),
+            thread_name_prefix="sql-worker",
+        )
+
+        # Speculative mode: start the SQL while Gemini is still streaming the
+        # rest of the JSON. Uses its own pool because speculative tasks wait
+        # on summary queries submitted to query_executor.
+        self.speculative_sql = os.getenv("SPECULATIVE_SQL", "false").lower() in ("1", "true", "yes")
+        self.speculation_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("DB_QUERY_WORKERS", "8")),
+            thread_name_prefix="sql-speculative",
+        )
+
+        # Rule-based fast path: template matches at or above this confidence skip the LLM
+        self.fast_path_min_confidence = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.75"))
+
+        # SQL templates learned from validated LLM output: same question shape,
+        # different product/year/TOP N -> slots filled locally, no LLM call
+        self.template_store = SqlTemplateStore(
+            max_templates=int(os.getenv("SQL_TEMPLATE_STORE_SIZE", "256")),
+        )
+
+        # Literals are sent as bind parameters; count the distinct statement
+        # shapes this produces (roughly the plans SQL Server has to compile)
+        self._plan_shapes = OrderedDict()  # hash -> None, LRU bounded by PLAN_SHAPES_TRACKED
+        self.plan_stats = {"executions": 0, "bound_literals": 0, "new_statements": 0}
+        self._plan_stats_lock = Lock()
+
+        # Results are streamed from a server-side cursor in FETCH_BATCH_SIZE
+        # batches; past INLINE_ROW_LIMIT rows the query goes to the Excel export
+        self.fetch_batch_size = int(os.getenv("FETCH_BATCH_SIZE", "2000"))
+        self.inline_row_limit = int(os.getenv("INLINE_ROW_LIMIT", "10000"))
+
+        # data_pull queries are COUNTed first: up to DATA_PULL_PREVIEW_MAX_ROWS
+        # the first DATA_PULL_PREVIEW_ROWS are shown next to the export, above it
+        # the export starts immediately without fetching anything in the request
+        self.preview_max_rows = int(os.getenv("DATA_PULL_PREVIEW_MAX_ROWS", "100000"))
+        self.preview_rows = int(os.getenv("DATA_PULL_PREVIEW_ROWS", "500"))
+
+        # Full result sets stay server-side (memory, spilling to disk); the
+        # response carries the first RESULT_PAGE_SIZE rows and a result_id
+        # for /api/results/<result_id>
+        self.result_store = ResultStore(
+            max_bytes=int(os.getenv("RESULT_STORE_MAX_MB", "128")) * 1024 * 1024,
+            spill_dir=os.getenv("RESULT_STORE_SPILL_DIR", "result_spill"),
+            max_disk_bytes=int(os.getenv("RESULT_STORE_MAX_DISK_MB", "1024")) * 1024 * 1024,
+            ttl_seconds=int(os.getenv("RESULT_STORE_TTL", "3600")),
+        )
+        self.result_page_size = int(os.getenv("RESULT_PAGE_SIZE", "200"))
+
+        # Time series charts are bucketed/downsampled server-side to at most
+        # CHART_MAX_POINTS points, so the table can stay paged
+        self.chart_max_points = int(os.getenv("CHART_MAX_POINTS", "500"))
+        # Grouped (non time series) answers chart the top CHART_TOP_K groups + "Others"
+        self.chart_top_k = int(os.getenv("CHART_TOP_K", "15"))
+
+        # Background exports: xlsx (default), csv, csv.gz or parquet - can be
+        # overridden per request (ask(export_format=...))
+        self.export_format = normalize_export_format(os.getenv("EXPORT_FORMAT", "xlsx"))
+        self.parquet_row_group_rows = int(os.getenv("PARQUET_ROW_GROUP_ROWS", "100000"))
+
+        # Export jobs live in a SQLite file shared by all worker processes,
+        # evicted (with their file) EXPORT_JOB_TTL seconds after they finish;
+        # jobs whose worker died are failed after EXPORT_JOB_STALE_SECONDS
+        self.export_jobs = ExportJobRegistry(
+            path=os.getenv("EXPORT_JOBS_DB", "export_jobs.sqlite3"),
+            ttl_seconds=int(os.getenv("EXPORT_JOB_TTL", "86400")),
+            stale_seconds=int(os.getenv("EXPORT_JOB_STALE_SECONDS", "120")),
+        )
+        # Insights generated after the data has been returned (two-phase
+        # responses) are kept the same way, so /api/insights/<id> works on
+        # any worker; uncollected ones are dropped after INSIGHT_JOB_TTL
+        self.insight_jobs = InsightJobRegistry(
+            path=os.getenv("INSIGHT_JOBS_DB", "insight_jobs.sqlite3"),
+            ttl_seconds=int(os.getenv("INSIGHT_JOB_TTL", "600")),
+            poll_interval=0.25,
+            stale_seconds=int(os.getenv("EXPORT_JOB_STALE_SECONDS", "120")),
+        )
+
     # ============================================================
     # HELPER METHOD: Fetch Database Schema
     # ============================================================
@@ -137,6 +326,103 @@ class QueryAgent:
             print(f"Error fetching schema: {e}")
             return "Error: Could not fetch database schema."
 
+    # ============================================================
+    # HELPER METHOD: Report Cache / Performance Counters
+    # ============================================================
+    def get_stats(self) -> dict:
+        """Returns the performance counters exposed by /api/stats."""
+        return {
+            "translation_cache": self.translation_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "sql_templates": self.template_store.stats(),
+            "sql_plans": self.get_plan_stats(),
+            "result_store": self.result_store.stats(),
+            "export_jobs": self.export_jobs.stats(),
+            "insight_jobs": self.insight_jobs.stats(),
+        }
+
+    def get_plan_stats(self) -> dict:
+        """
+        Distinct parameterized statements produced vs. statements executed.
+        distinct_statements covers the last PLAN_SHAPES_TRACKED shapes;
+        new_statements counts shapes not in that window when they ran.
+        """
+        with self._plan_stats_lock:
+            return dict(self.plan_stats, distinct_statements=len(self._plan_shapes))
+
+    # ============================================================
+    # HELPER METHOD: Keep Large Results Server-Side, Return Page 1
+    # ============================================================
+    def _attach_result_page(self, response, rows):
+        """
+        Sets response["data"] to the first RESULT_PAGE_SIZE rows and keeps the
+        full list in the result store under response["result_id"], so the
+        table can page through it via /api/results/<result_id>.
+        """
+        response["total_rows"] = len(rows)
+        if self.result_page_size <= 0 or len(rows) <= self.result_page_size:
+            response["data"] = rows
+            response["result_id"] = None
+            return response
+
+        response["result_id"] = self.result_store.put(rows)
+        response["data"] = rows[:self.result_page_size]
+        return response
+
+    def get_result_page(self, result_id, offset=0, limit=None, sort=None):
+        """One page of a stored result (see ResultStore.get_page); None if it expired."""
+        limit = self.result_page_size if limit is None else min(limit, self.inline_row_limit)
+        return self.result_store.get_page(result_id, offset=offset, limit=limit, sort=sort)
+
+    # ============================================================
+    # HELPER METHOD: Chart Payload Built From the Full Result
+    # ============================================================
+    def _build_chart(self, rows, is_time_series, query_type):
+        """
+        Bounded, chart-ready series: bucketed/downsampled for time series,
+        top K groups + "Others" for analytical/comparison answers.
+        """
+        if not rows or (len(rows) < 2 and not is_time_series):
+            return None
+        if not is_time_series and query_type not in ("analytical", "comparison"):
+            return None
+        chart_started = time.perf_counter()
+        try:
+            if is_time_series:
+                return build_time_series_chart(rows, max_points=self.chart_max_points)
+            return build_category_chart(rows, top_k=self.chart_top_k)
+        except Exception as e:
+            print(f"⚠️ Could not build chart series: {repr(e)}")
+            return None
+        finally:
+            self._record_stage("chart", chart_started)
+
+    # ============================================================
+    # HELPER METHOD: Per-Stage Timings of the Current Request
+    # ============================================================
+    def _record_stage(self, stage, started):
+        """Adds the time since `started` (perf_counter) to the current request's stage."""
+        stages = getattr(_request_timings, "stages", None)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + (time.perf_counter() - started)
+
+    def _submit_timed(self, executor, fn, *args):
+        """Submits fn to a worker pool, recording its stages against the calling request."""
+        stages = getattr(_request_timings, "stages", None)
+
+        def run():
+            _request_timings.stages = stages
+            try:
+                return fn(*args)
+            finally:
+                _request_timings.stages = None
+
+        return executor.submit(run)
+
+    def get_last_timings(self) -> dict:
+        """Seconds spent per stage in the last ask() made by the calling thread."""
+        return dict(getattr(_request_timings, "stages", None) or {})
+
     # ============================================================
     # HELPER METHOD: Clean LLM Response to Extract JSON
     # ============================================================
@@ -154,6 +440,46 @@ class QueryAgent:
             
         return None
     
+    # ============================================================
+    # HELPER METHOD: Stream the LLM JSON and Start the SQL Early
+    # ============================================================
+    def _generate_sql_speculatively(self, prompt):
+        """
+        Streams the NL -> SQL response. The prompt asks for "sql_query" first,
+        so as soon as that string closes the (fixed) SQL is dispatched while the
+        remaining keys are still being generated.
+        Returns (llm_text, speculation); speculation is None if nothing was started.
+        The caller must cancel the speculation if the final JSON doesn't confirm it.
+        """
+        extractor = StreamingSqlExtractor()
+        chunks = []
+        speculation = None
+        llm_started = time.perf_counter()
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                chunk_text = getattr(chunk, "text", "")
+                if not chunk_text:
+                    continue
+                chunks.append(chunk_text)
+
+                streamed_sql = extractor.feed(chunk_text) if speculation is None else None
+                if streamed_sql:
+                    speculative_sql = self._fix_product_column_in_sql(streamed_sql)
+                    print(f"⚡ Speculatively executing SQL while the LLM finishes: {speculative_sql}")
+                    speculation = SpeculativeQuery(speculative_sql)
+                    speculation.future = self._submit_timed(
+                        self.speculation_executor, self._execute_query_with_summary, speculative_sql, speculation.cancel_event
+                    )
+        except Exception as e:
+            print(f"⚠️ Streaming LLM call failed, falling back to a blocking call: {repr(e)}")
+            if speculation is not None:
+                speculation.cancel()
+            return "", None
+        finally:
+            self._record_stage("llm", llm_started)
+
+        return "".join(chunks).strip(), speculation
+
     # ============================================================
     # HELPER METHOD: Fix SQL to Use Normalized Columns (NEW!)
     # ============================================================
@@ -242,18 +568,272 @@ class QueryAgent:
         return fixed_sql
     
     # ============================================================
-    # NEW HELPER METHOD: Generate Summary Statistics Query (Smarter)
+    # HELPER METHOD: Bind-Parameterize Literals in Generated SQL
     # ============================================================
-    def _generate_summary_query(self, original_query: str) -> str:
+    def _parameterize_sql(self, sql_query):
         """
-        Converts a detailed query into an aggregate summary query.
-        Finds the main FROM and WHERE clauses, even in complex WITH queries.
-        Dynamically adjusts summary context (e.g., Top Product vs Top Company)
-        based on the original query's GROUP BY clause.
-        
-        --- NEW: This version is highly optimized to avoid slow correlated subqueries. ---
+        Rewrites the literals of a generated query into named bind parameters
+        so every product/year/TOP N variant shares one cached plan on SQL Server.
+        Returns (parameterized_sql, params).
+
+        Only values that are safe to bind are touched:
+        - TOP n                                    -> TOP (:pN)
+        - string literals in WHERE / HAVING / ON   -> :pN
+        - numbers compared in WHERE / HAVING / ON  -> :pN
+        - DATEFROMPARTS(2024, 1, 1) constant dates -> DATEFROMPARTS(:pN, :pN, :pN)
+        Literals in the SELECT list / GROUP BY stay inline, since SQL Server
+        would not match a parameterized SELECT expression to its GROUP BY.
+        """
+        token_pattern = re.compile(
+            r"(?P<string>N?'(?:[^']|'')*')"
+            r"|(?P<ident>\[[^\]]*\])"
+            r"|(?P<datefromparts>\bDATEFROMPARTS\s*\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*\))"
+            r"|(?P<top>\bTOP\s+(?P<top_value>\d+)\b)"
+            r"|(?P<clause>\b(?:SELECT|FROM|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|ON)\b)"
+            r"|(?P<paren>[()])"
+            r"|(?P<number>(?<![\w.@:])\d+(?:\.\d+)?(?![\w.]))",
+            re.IGNORECASE,
+        )
+        bindable_clauses = ("WHERE", "HAVING", "ON")
+
+        params = {}
+        parts = []
+        position = 0
+        clause_stack = ["SELECT"]  # Current clause per parenthesis depth
+
+        def add_param(value):
+            name = f"p{len(params)}"
+            params[name] = value
+            return f":{name}"
+
+        for m in token_pattern.finditer(sql_query):
+            replacement = None
+            in_filter = clause_stack[-1] in bindable_clauses
+
+            if m.group("paren") == "(":
+                clause_stack.append(clause_stack[-1])
+            elif m.group("paren") == ")":
+                if len(clause_stack) > 1:
+                    clause_stack.pop()
+            elif m.group("clause"):
+                clause_stack[-1] = re.sub(r'\s+', ' ', m.group("clause").upper())
+            elif m.group("top"):
+                replacement = f"TOP ({add_param(int(m.group('top_value')))})"
+            elif m.group("string") and in_filter and not m.group("string").upper().startswith("N"):
+                replacement = add_param(m.group("string")[1:-1].replace("''", "'"))
+            elif m.group("datefromparts") and in_filter:
+                values = [int(v) for v in re.findall(r'\d+', m.group("datefromparts"))]
+                replacement = "DATEFROMPARTS(" + ", ".join(add_param(v) for v in values) + ")"
+            elif m.group("number") and in_filter:
+                # Only values being compared: "x >= 1000", "BETWEEN 1 AND 5"
+                preceding = sql_query[max(0, m.start() - 12):m.start()]
+                if re.search(r"(?:[=<>]|\bBETWEEN|\bAND)\s*$", preceding, re.IGNORECASE):
+                    number = m.group("number")
+                    replacement = add_param(float(number) if '.' in number else int(number))
+
+            if replacement is not None:
+                parts.append(sql_query[position:m.start()])
+                parts.append(replacement)
+                position = m.end()
+
+        parts.append(sql_query[position:])
+        parameterized_sql = ''.join(parts)
+
+        # Distinct statement shapes sent to the server (~ plans it has to compile)
+        shape = hash(ResultCache.normalize_sql(parameterized_sql))
+        with self._plan_stats_lock:
+            if shape in self._plan_shapes:
+                self._plan_shapes.move_to_end(shape)
+            else:
+                self._plan_shapes[shape] = None
+                self.plan_stats["new_statements"] += 1
+                if len(self._plan_shapes) > PLAN_SHAPES_TRACKED:
+                    self._plan_shapes.popitem(last=False)
+            self.plan_stats["executions"] += 1
+            self.plan_stats["bound_literals"] += len(params)
+
+        return parameterized_sql, params
+
+    # ============================================================
+    # HELPER METHOD: Execute SQL with Auto-Retry Fallback
+    # ============================================================
+    def _execute_parameterized(self, query, conn):
+        """Executes a literal SQL statement in its bind-parameterized form."""
+        parameterized_sql, params = self._parameterize_sql(query)
+        # Bind strings as VARCHAR - NVARCHAR params would force an
+        # implicit conversion (and a scan) on the VARCHAR view columns
+        statement = text(parameterized_sql).bindparams(
+            *[bindparam(name, type_=String()) for name, value in params.items() if isinstance(value, str)]
+        )
+        return conn.execute(statement, params)
+
+    def _try_execute_sql(self, query, conn):
+        """Executes SQL, retrying once with LIKE if the LLM used '=' on a name column."""
+        try:
+            result = self._execute_parameterized(query, conn)
+            return result
+        except Exception as e:
+            if "Invalid column" in str(e) or "Syntax" in str(e):
+                print("⚠️ LLM might have used '=' instead of LIKE. Retrying with LIKE...")
+                query_like = re.sub(r"(Importer_Name|Exporter_Name|Product_Name)\s*=\s*'([^']+)'", r"\1 LIKE '%\2%'", query)
+                print(f"🔄 Retrying modified SQL:\n{query_like}\n")
+                return self._execute_parameterized(query_like, conn)
+            else:
+                raise
+
+    # ============================================================
+    # HELPER METHOD: Stream Query Results in Batches (server-side cursor)
+    # ============================================================
+    def _iter_query_batches(self, sql_query, cancel_event=None, format_dates=True):
+        """
+        Executes the query with stream_results=True and yields formatted rows
+        one fetchmany() batch at a time, so only the current batch is held in memory.
+        format_dates=False keeps date/datetime values (typed Parquet exports).
+        Close the generator to release the cursor/connection early.
+        """
+        with self.engine.connect() as conn:
+            _check_cancelled(cancel_event)
+            sql_started = time.perf_counter()
+            result = self._try_execute_sql(sql_query, conn.execution_options(stream_results=True))
+            column_names = list(result.keys())
+            try:
+                while True:
+                    _check_cancelled(cancel_event)
+                    rows = result.fetchmany(self.fetch_batch_size)
+                    self._record_stage("sql", sql_started)
+                    if not rows:
+                        break
+
+                    formatting_started = time.perf_counter()
+                    batch = format_rows(rows, column_names, format_dates)
+                    self._record_stage("row_formatting", formatting_started)
+                    yield batch
+                    sql_started = time.perf_counter()
+            finally:
+                result.close()
+
+    # ============================================================
+    # HELPER METHOD: Run Main Query (own pooled connection)
+    # ============================================================
+    def _run_main_query(self, sql_query, cancel_event=None, row_limit=None):
+        """
+        Executes the user's query and returns the formatted rows.
+        Stops fetching once more than row_limit (default INLINE_ROW_LIMIT) rows
+        have arrived and returns only the first row_limit + 1 - the caller treats
+        that as "too large to show inline" and sends the query to the export path.
+        """
+        limit = self.inline_row_limit if row_limit is None else row_limit
+        formatted_rows = []
+        batches = self._iter_query_batches(sql_query, cancel_event)
+        try:
+            for batch in batches:
+                formatted_rows.extend(batch)
+                if len(formatted_rows) > limit:
+                    del formatted_rows[limit + 1:]
+                    print(f"--- Result exceeds {limit:,} rows, stopped fetching ---")
+                    break
+        finally:
+            batches.close()
+        return formatted_rows
+
+    # ============================================================
+    # HELPER METHOD: Run Summary Statistics Query (own pooled connection)
+    # ============================================================
+    def _run_summary_query(self, summary_query, cancel_event=None):
+        """Executes the summary-statistics query and returns its rows as dicts."""
+        summary_started = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                _check_cancelled(cancel_event)
+                summary_result = self._try_execute_sql(summary_query, conn)
+                _check_cancelled(cancel_event)
+                summary_rows = summary_result.fetchall()
+                summary_column_names = summary_result.keys()
+                return [dict(zip(summary_column_names, row)) for row in summary_rows]
+        finally:
+            self._record_stage("summary", summary_started)
+
+    # ============================================================
+    # HELPER METHOD: Run Main Query + Summary Statistics Query Concurrently
+    # ============================================================
+    def _execute_query_with_summary(self, sql_query, cancel_event=None, row_limit=None):
+        """
+        Runs the main query and its summary-statistics query at the same time
+        on two pooled connections, so latency is max(main, summary) instead of the sum.
+        Returns (formatted_rows, summary_stats).
+        """
+        # Start the summary scan first - it only depends on the SQL text
+        summary_query = self._generate_summary_query(sql_query)
+        summary_future = None
+        if summary_query:
+            summary_future = self._submit_timed(self.query_executor, self._run_summary_query, summary_query, cancel_event)
+        else:
+            print("--- Skipping summary query (could not be generated) ---")
+
+        try:
+            formatted_rows = self._run_main_query(sql_query, cancel_event, row_limit)
+        except Exception:
+            if summary_future:
+                summary_future.cancel()
+            raise
+
+        summary_stats = None
+        if summary_future:
+            try:
+                summary_stats = summary_future.result()
+            except QueryCancelled:
+                raise
+            except Exception as e:
+                # The summary only feeds the insights - don't fail the whole answer
+                print(f"⚠️ Summary query failed: {e}")
+
+        return formatted_rows, summary_stats
+
+    # ============================================================
+    # HELPER METHOD: Data Watermark for Result Cache Invalidation
+    # ============================================================
+    def _get_data_watermark(self, sql_query):
+        """
+        Returns the latest BE_Date/SB_Date of the views referenced by the query.
+        Cached results are only reused while this value stays the same.
+        The MAX() lookups are re-checked at most every RESULT_CACHE_WATERMARK_INTERVAL seconds.
+        Returns None if the watermark can't be determined (result caching is skipped).
+        """
+        watermark_columns = {
+            'View_Clean_Imports': 'BE_Date',
+            'View_Clean_Exports': 'SB_Date',
+        }
+        tables = [t for t in watermark_columns if re.search(r'\b' + t + r'\b', sql_query, re.IGNORECASE)]
+        if not tables:
+            return None
+
+        watermark = []
+        now = time.time()
+        try:
+            for table in tables:
+                with self._watermark_lock:
+                    checked_at, value = self._watermarks.get(table, (0, None))
+                if now - checked_at > self.watermark_check_interval:
+                    with self.engine.connect() as conn:
+                        value = conn.execute(text(f"SELECT MAX({watermark_columns[table]}) FROM {table}")).scalar()
+                    with self._watermark_lock:
+                        self._watermarks[table] = (now, value)
+                watermark.append((table, str(value)))
+        except Exception as e:
+            print(f"⚠️ Could not read data watermark: {e}")
+            return None
+
+        return tuple(watermark)
+
+    # ============================================================
+    # HELPER METHOD: Extract Main FROM Table and WHERE Clause
+    # ============================================================
+    def _extract_from_where(self, original_query):
+        """
+        Finds the main FROM table and WHERE clause, even in complex WITH queries.
+        The WHERE clause is made SARGable and stripped of the table alias.
+        Returns (main_block, table_name, where_clause) or None.
         """
-        
         query_to_search = original_query
         
         # --- Handle WITH clauses ---
@@ -267,7 +847,7 @@ class QueryAgent:
         table_match = re.search(r'FROM\s+([\w\.]+)(?:(?:\s+as\s+|\s+)(\w+))?', query_to_search, re.IGNORECASE)
         
         if not table_match:
-            print("--- Debug: Summary query could not find FROM clause. ---")
+            print("--- Debug: Could not find FROM clause. ---")
             return None
             
         table_name = table_match.group(1) # e.g., "EximExport"
@@ -311,7 +891,27 @@ class QueryAgent:
                 alias_pattern = r'\b' + re.escape(table_alias) + r'\.'
                 where_clause = re.sub(alias_pattern, '', where_clause, flags=re.IGNORECASE)
                 print(f"--- Debug: Stripped alias '{table_alias}' from WHERE: {where_clause}")
+
+        return query_to_search, table_name, where_clause
+
+    # ============================================================
+    # NEW HELPER METHOD: Generate Summary Statistics Query (Smarter)
+    # ============================================================
+    def _generate_summary_query(self, original_query: str) -> str:
+        """
+        Converts a detailed query into an aggregate summary query.
+        Finds the main FROM and WHERE clauses, even in complex WITH queries.
+        Dynamically adjusts summary context (e.g., Top Product vs Top Company)
+        based on the original query's GROUP BY clause.
+        
+        --- NEW: This version is highly optimized to avoid slow correlated subqueries. ---
+        """
         
+        extracted = self._extract_from_where(original_query)
+        if not extracted:
+            return None
+        query_to_search, table_name, where_clause = extracted
+
         # --- Determine which columns to use based on table ---
         if 'import' in table_name.lower():
             date_col = 'BE_Date'
@@ -381,13 +981,191 @@ class QueryAgent:
         return summary_query.strip()
     
     # ============================================================
-    # HELPER METHOD: Generate Analytical Insights with Summary Stats
+    # HELPER METHOD: COUNT-First Planning for data_pull Queries
     # ============================================================
-    def _generate_insights(self, user_query, viz_data, summary_stats):
+    def _plan_data_pull(self, sql_query):
+        """
+        For plain row pulls (no TOP / GROUP BY / DISTINCT / JOIN / UNION) runs a
+        COUNT_BIG(*) with the same FROM/WHERE before fetching anything, and picks:
+        - "inline":  up to INLINE_ROW_LIMIT rows, answered as usual
+        - "preview": up to DATA_PULL_PREVIEW_MAX_ROWS, first page shown + Excel export
+        - "export":  larger pulls go straight to the background export
+        Returns {"mode", "row_count"} or None when the query can't be planned.
+        """
+        count_query = self._simple_count_query(sql_query)
+        if not count_query:
+            return None
+
+        count_started = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                row_count = self._try_execute_sql(count_query, conn).scalar()
+        except Exception as e:
+            print(f"⚠️ Row count query failed, fetching without a plan: {e}")
+            return None
+        finally:
+            self._record_stage("count", count_started)
+
+        row_count = int(row_count or 0)
+        if row_count <= self.inline_row_limit:
+            mode = "inline"
+        elif row_count <= self.preview_max_rows:
+            mode = "preview"
+        else:
+            mode = "export"
+        print(f"--- Data pull plan: {row_count:,} rows -> {mode} ---")
+        return {"mode": mode, "row_count": row_count}
+
+    def _simple_count_query(self, sql_query):
+        """COUNT_BIG(*) over the same FROM/WHERE for plain row pulls, else None."""
+        if re.search(r'\b(?:TOP|GROUP\s+BY|DISTINCT|JOIN|UNION|HAVING|WITH|OFFSET)\b', sql_query, re.IGNORECASE):
+            return None
+        extracted = self._extract_from_where(sql_query)
+        if not extracted:
+            return None
+        _, table_name, where_clause = extracted
+        return f"SELECT COUNT_BIG(*) AS TotalRows FROM {table_name} {where_clause}"
+
+    # ============================================================
+    # HELPER METHOD: Expected Row Count of an Export
+    # ============================================================
+    def _count_export_rows(self, sql_query):
+        """
+        Row count for export progress, only where it is cheap: plain pulls
+        get the FROM/WHERE count. Other queries (GROUP BY, JOIN, OFFSET, ...)
+        would have to run a second time just to be counted, so they return
+        None and the job reports rows written without a percentage.
+        """
+        count_query = self._simple_count_query(sql_query)
+        if not count_query:
+            return None
+
+        try:
+            with self.engine.connect() as conn:
+                return int(self._try_execute_sql(count_query, conn).scalar() or 0)
+        except Exception as e:
+            print(f"⚠️ Export row count failed, progress will be approximate: {e}")
+            return None
+
+    def _update_export_progress(self, job_id, file_path, rows_written, expected_rows, started):
+        """Progress, throughput and ETA of a running export (called after every batch)."""
+        elapsed = time.time() - started
+        rate = rows_written / elapsed if elapsed > 0 else None
+        try:
+            bytes_written = os.path.getsize(file_path)
+        except OSError:
+            bytes_written = 0
+
+        progress, eta = None, None
+        if expected_rows:
+            progress = min(99, int(rows_written * 100 / expected_rows))
+            if rate:
+                eta = round(max(0, expected_rows - rows_written) / rate, 1)
+
+        self._update_export_job(
+            job_id,
+            progress=progress,
+            rows_written=rows_written,
+            bytes_written=bytes_written,
+            rows_per_second=round(rate, 1) if rate else None,
+            elapsed_seconds=round(elapsed, 1),
+            eta_seconds=eta,
+        )
+
+    def _update_export_job(self, job_id, **fields):
+        """Updates an export job and wakes up everyone streaming its status."""
+        self.export_jobs.update(job_id, **fields)
+
+    def get_export_job(self, job_id):
+        """Status and metadata of an export job, or None if unknown/expired."""
+        return self.export_jobs.get(job_id)
+
+    def iter_export_status(self, job_id, min_interval=0.25, heartbeat=15, timeout=3600):
+        """
+        Yields a snapshot of an export job every time it changes, until it is
+        ready or failed. Updates closer than `min_interval` seconds are merged
+        into one; None is yielded after `heartbeat` idle seconds so the caller
+        can keep the connection alive. Yields nothing for unknown ids.
         """
-        Creates business insights by analyzing:
+        seen = -1
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.export_jobs.wait_for_change(
+                job_id, seen, timeout=min(heartbeat, max(0, deadline - time.time())),
+            )
+            if job is None:
+                return
+            if job["version"] == seen:
+                yield None
+                continue
+            seen = job["version"]
+            yield job
+            if job["status"] != "processing":
+                return
+            time.sleep(min_interval)
+
+    # ============================================================
+    # HELPER METHOD: Export a Query to a File in the Background
+    # ============================================================
+    def _start_export_job(self, sql_query, export_format=None, expected_rows=None):
+        """
+        Re-runs the query and streams it from the server-side cursor straight
+        into an xlsx/csv/csv.gz/parquet file on a background thread. Returns the job id.
+        expected_rows (e.g. from the data pull plan) drives the progress/ETA;
+        without it the rows are counted first, on the export thread.
+        """
+        export_format = export_format or self.export_format
+        job_id = self.export_jobs.create(
+            status="processing", progress=0, file=None, format=export_format, sql=sql_query,
+            expected_rows=expected_rows, rows_written=0, bytes_written=0,
+            rows_per_second=None, elapsed_seconds=0.0, eta_seconds=None,
+            count_seconds=None, finished_at=None, error=None,
+        )
+        def export_job():
+            try:
+                export_dir = "exports"
+                os.makedirs(export_dir, exist_ok=True)
+                filename = f"export_{job_id}.{EXPORT_FORMATS[export_format]['extension']}"
+                file_path = os.path.join(export_dir, filename)
+
+                count_started = time.time()
+                expected = expected_rows if expected_rows is not None else self._count_export_rows(sql_query)
+                started = time.time()
+                self._update_export_job(job_id, expected_rows=expected, count_seconds=round(started - count_started, 3))
+
+                def tracked_batches():
+                    # The writer has consumed a batch by the time the generator resumes
+                    written = 0
+                    for batch in self._iter_query_batches(sql_query, format_dates=export_format != 'parquet'):
+                        yield batch
+                        written += len(batch)
+                        self._update_export_progress(job_id, file_path, written, expected, started)
+
+                # One fetch batch in memory at a time, whatever the format
+                rows_written = write_export(
+                    tracked_batches(), file_path, export_format,
+                    row_group_rows=self.parquet_row_group_rows,
+                )
+                self._update_export_progress(job_id, file_path, rows_written, expected, started)
+                print(f"--- Export {job_id}: {rows_written:,} rows written to {filename} ---")
+                self._update_export_job(
+                    job_id, status="ready", progress=100, eta_seconds=0, file=filename, finished_at=time.time(),
+                )
+            except Exception as e:
+                self._update_export_job(job_id, status="error", error=str(e), finished_at=time.time())
+                print("Export error:", e)
+        Thread(target=export_job).start()
+        return job_id
+
+    # ============================================================
+    # HELPER METHOD: Build the Insight Prompt from Summary Stats
+    # ============================================================
+    def _build_insight_prompt(self, user_query, viz_data, summary_stats):
+        """
+        Builds the business-analyst prompt from:
         1. Summary statistics (accurate aggregates from ALL rows)
         2. Representative sample data (for qualitative context)
+        Returns None if there is nothing to analyze.
         """
         
         if not summary_stats or len(summary_stats) == 0:
@@ -488,7 +1266,18 @@ COMPLETE DATASET STATISTICS (from all {safe_format('TotalRecords', ',')} records
                             Example format:
                             "The zinc import market shows significant activity with [X] companies collectively importing ₹[Y] worth of materials. [Top Company] dominates with [Z%] market share. The weighted average price of ₹[W]/kg suggests [insight]. This indicates [business implication]."
                             """
-        
+        return insight_prompt
+
+    # ============================================================
+    # HELPER METHOD: Generate Analytical Insights with Summary Stats
+    # ============================================================
+    def _generate_insights(self, user_query, viz_data, summary_stats):
+        """Creates business insights from the summary stats and sample rows (blocking call)."""
+        insight_prompt = self._build_insight_prompt(user_query, viz_data, summary_stats)
+        if not insight_prompt:
+            return None
+
+        insights_started = time.perf_counter()
         try:
             print("--- Generating analytical insights with full dataset stats ---")
             insight_response = self.model.generate_content(insight_prompt)
@@ -497,7 +1286,87 @@ COMPLETE DATASET STATISTICS (from all {safe_format('TotalRecords', ',')} records
         except Exception as e:
             print(f"Error generating insights: {e}")
             return None
+        finally:
+            self._record_stage("insights", insights_started)
         
+    # ============================================================
+    # HELPER METHOD: Generate Insights in the Background (Two-Phase Response)
+    # ============================================================
+    def _start_insight_job(self, user_query, viz_data, summary_stats):
+        """
+        Streams the insight text from Gemini in a background thread and returns
+        its insight_id, or None if there is nothing to analyze. Chunks are
+        appended to the job as they arrive so SSE clients can forward them
+        immediately (see iter_insight_chunks()).
+        """
+        insight_prompt = self._build_insight_prompt(user_query, viz_data, summary_stats)
+        if not insight_prompt:
+            return None
+
+        insight_id = self.insight_jobs.create(insights=None, chunks=[])
+
+        # The deferred insight time still counts as the request's "insights" stage
+        stages = getattr(_request_timings, "stages", None)
+
+        def insight_job():
+            _request_timings.stages = stages
+            insights_started = time.perf_counter()
+            chunks = []
+            try:
+                print("--- Streaming analytical insights with full dataset stats ---")
+                for chunk in self.model.generate_content(insight_prompt, stream=True):
+                    chunk_text = getattr(chunk, "text", "")
+                    if not chunk_text:
+                        continue
+                    chunks.append(chunk_text)
+                    self.insight_jobs.update(insight_id, chunks=chunks)
+            except Exception as e:
+                print(f"Error generating insights: {e}")
+            finally:
+                insights = "".join(chunks).strip() or None
+                # Recorded before the job is marked done, so waiters see it
+                self._record_stage("insights", insights_started)
+                _request_timings.stages = None
+                self.insight_jobs.update(insight_id, status="ready" if insights else "error", insights=insights)
+
+        Thread(target=insight_job, daemon=True).start()
+        return insight_id
+
+    def get_insights(self, insight_id, timeout=0):
+        """
+        Returns {"status", "insights"} for an insight job, waiting up to
+        `timeout` seconds for it to finish. Returns None for unknown ids.
+        """
+        deadline = time.time() + timeout
+        job = self.insight_jobs.get(insight_id)
+        while job is not None and job["status"] == "processing":
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            job = self.insight_jobs.wait_for_change(insight_id, job["version"], remaining)
+        if job is None:
+            return None
+        return {"status": job["status"], "insights": job["insights"]}
+
+    def iter_insight_chunks(self, insight_id, timeout=120):
+        """
+        Yields the insight text chunks of a job as Gemini produces them,
+        until the job finishes (or `timeout` seconds pass).
+        """
+        sent = 0
+        deadline = time.time() + timeout
+        job = self.insight_jobs.get(insight_id)
+        while job is not None:
+            new_chunks = job["chunks"][sent:]
+            sent += len(new_chunks)
+            for chunk in new_chunks:
+                yield chunk
+
+            remaining = deadline - time.time()
+            if job["status"] != "processing" or remaining <= 0:
+                return
+            job = self.insight_jobs.wait_for_change(insight_id, job["version"], remaining)
+
     # ============================================================
     # HELPER METHOD: Detect and Respond to Small Talk
     # ============================================================
@@ -533,11 +1402,203 @@ COMPLETE DATASET STATISTICS (from all {safe_format('TotalRecords', ',')} records
         else:
             return None
 
+    # ============================================================
+    # HELPER METHOD: Rule-Based Fast Path for Common Question Shapes
+    # ============================================================
+    def _detect_common_intent(self, user_query: str):
+        """
+        Recognizes the most frequent question templates and builds the same
+        SARGable SQL the LLM prompt prescribes, without calling Gemini:
+        - "top N <product> importers/exporters" (CTE Top-N)
+        - "total value of <product> imports/exports in <year>"
+        - "monthly trend of <product> imports/exports"
+        Returns (llm_data, confidence), or (None, 0.0) if no template matches.
+        """
+        query = re.sub(r'[?.!,]+', ' ', user_query.strip().lower())
+        query = re.sub(r'\s+', ' ', query).strip()
+        query = re.sub(r'^(?:please |can you |could you )?(?:show(?: me)?|list|get|give me|find|what (?:is|are)|who (?:is|are))\s+', '', query)
+        query = re.sub(r'^the ', '', query)
+
+        direction_words = r'(import|imports|importer|importers|importing|imported|export|exports|exporter|exporters|exporting|exported)'
+        product_words = r'([a-z][a-z0-9\- ]{1,40}?)'
+        period_words = r'(?:\s+(?:(?:in|for|during|since|from)\s+)?(\d{4}|this year|last year))?'
+
+        # Words that mean the question has constraints the templates don't cover
+        unsupported_words = {'vs', 'versus', 'compare', 'comparison', 'and', 'or', 'between', 'rate', 'rates',
+                             'price', 'prices', 'average', 'per', 'country', 'port', 'air', 'sea', 'hs', 'code',
+                             'not', 'except', 'excluding', 'all', 'products', 'product', 'of', 'by',
+                             'in', 'for', 'since', 'from', 'this', 'last', 'year', 'years', 'month', 'months'}
+        generic_words = {'top', 'total', 'value', 'monthly', 'trend', 'companies', 'company', 'data'}
+
+        intent = None
+        match = (re.fullmatch(r'top (\d+) ' + product_words + r' ' + direction_words + r'(?: by (value|quantity|volume))?' + period_words, query)
+                 or re.fullmatch(r'top (\d+) ' + direction_words + r' of ' + product_words + r'(?: by (value|quantity|volume))?' + period_words, query)
+                 or re.fullmatch(r'top (\d+) companies ' + direction_words + r' ' + product_words + r'(?: by (value|quantity|volume))?' + period_words, query))
+        if match:
+            groups = match.groups()
+            # The direction and product groups swap places between the variants
+            if re.fullmatch(direction_words, groups[1]):
+                top_n, direction, product = groups[0], groups[1], groups[2]
+            else:
+                top_n, product, direction = groups[0], groups[1], groups[2]
+            intent = {"shape": "top_n", "top_n": int(top_n), "product": product, "direction": direction,
+                      "metric": groups[3] or 'value', "period": groups[4]}
+
+        if not intent:
+            match = (re.fullmatch(r'(?:the )?total (?:value|import value|export value) of ' + product_words + r' ' + direction_words + period_words, query)
+                     or re.fullmatch(r'(?:the )?total (?:value|import value|export value) of ' + direction_words + r' of ' + product_words + period_words, query)
+                     or re.fullmatch(r'(?:the )?total ' + product_words + r' ' + direction_words + r' value' + period_words, query))
+            if match:
+                first, second, period = match.groups()
+                if re.fullmatch(direction_words, first):
+                    direction, product = first, second
+                else:
+                    product, direction = first, second
+                intent = {"shape": "total_value", "product": product, "direction": direction, "period": period}
+
+        if not intent:
+            match = (re.fullmatch(r'(?:the )?monthly trend of ' + product_words + r' ' + direction_words + period_words, query)
+                     or re.fullmatch(r'(?:the )?monthly trend of ' + direction_words + r' of ' + product_words + period_words, query)
+                     or re.fullmatch(r'(?:the )?monthly ' + product_words + r' ' + direction_words + r' trend' + period_words, query))
+            if match:
+                first, second, period = match.groups()
+                if re.fullmatch(direction_words, first):
+                    direction, product = first, second
+                else:
+                    product, direction = first, second
+                intent = {"shape": "monthly_trend", "product": product, "direction": direction, "period": period}
+
+        if not intent:
+            return None, 0.0
+
+        # --- Confidence scoring ---
+        product = intent["product"].strip()
+        product_tokens = product.split()
+        confidence = 1.0
+        if any(token in unsupported_words for token in product_tokens):
+            confidence -= 0.5
+        if any(token in generic_words or re.fullmatch(direction_words, token) for token in product_tokens):
+            confidence -= 0.5
+        if len(product_tokens) > 3:
+            confidence -= 0.3
+        if re.search(r'\d', product):
+            confidence -= 0.2
+        if intent["shape"] == "top_n" and not 1 <= intent["top_n"] <= 100:
+            confidence -= 0.5
+
+        # --- Table selection ---
+        is_import = intent["direction"].startswith('import')
+        view = 'View_Clean_Imports' if is_import else 'View_Clean_Exports'
+        date_col = 'BE_Date' if is_import else 'SB_Date'
+        role = 'Importers' if is_import else 'Exporters'
+        flow = 'Imports' if is_import else 'Exports'
+
+        # Same normalization _fix_product_column_in_sql applies (letters/digits/hyphens only)
+        product_pattern = product.replace(' ', '').upper()
+        product_title = product.title()
+
+        # --- SARGable date range ---
+        period = intent.get("period")
+        if not period:
+            date_range, period_label = None, ""
+        elif period == 'this year':
+            date_range = ("DATEFROMPARTS(YEAR(GETDATE()), 1, 1)", "DATEFROMPARTS(YEAR(GETDATE()) + 1, 1, 1)")
+            period_label = " (This Year)"
+        elif period == 'last year':
+            date_range = ("DATEFROMPARTS(YEAR(GETDATE()) - 1, 1, 1)", "DATEFROMPARTS(YEAR(GETDATE()), 1, 1)")
+            period_label = " (Last Year)"
+        else:
+            year = int(period)
+            if not 2000 <= year <= 2099:
+                return None, 0.0
+            since = re.search(r'\b(?:since|from) ' + period + r'$', query)
+            date_range = (f"DATEFROMPARTS({year}, 1, 1)", None if since else f"DATEFROMPARTS({year + 1}, 1, 1)")
+            period_label = f" (Since {year})" if since else f" ({year})"
+
+        def where_clause(prefix=''):
+            conditions = [f"{prefix}[Product] LIKE '%{product_pattern}%'"]
+            if date_range:
+                conditions.append(f"{prefix}{date_col} >= {date_range[0]}")
+                if date_range[1]:
+                    conditions.append(f"{prefix}{date_col} < {date_range[1]}")
+            return "WHERE " + " AND ".join(conditions)
+
+        if intent["shape"] == "top_n":
+            top_n = intent["top_n"]
+            rank_expr = 'SUM(QUANTITY_KG)' if intent["metric"] in ('quantity', 'volume') else 'SUM(Total_Value_INR)'
+            metric_label = 'Quantity' if intent["metric"] in ('quantity', 'volume') else 'Value'
+            sql_query = (
+                f"WITH TopCompanies AS ( "
+                f"SELECT TOP {top_n} [Importer/Exporter_Name], {rank_expr} AS OverallValue "
+                f"FROM {view} {where_clause()} "
+                f"GROUP BY [Importer/Exporter_Name] ORDER BY OverallValue DESC ) "
+                f"SELECT v.[Importer/Exporter_Name], "
+                f"SUM(v.Total_Value_INR) AS Total_Value_INR, "
+                f"SUM(v.QUANTITY_KG) AS Total_Quantity_KG, "
+                f"SUM(v.Total_Value_INR) / NULLIF(SUM(v.QUANTITY_KG), 0) AS WeightedAvgPrice_INR "
+                f"FROM {view} v "
+                f"INNER JOIN TopCompanies tc ON v.[Importer/Exporter_Name] = tc.[Importer/Exporter_Name] "
+                f"{where_clause('v.')} "
+                f"GROUP BY v.[Importer/Exporter_Name] "
+                f"ORDER BY MAX(tc.OverallValue) DESC"
+            )
+            llm_data = {
+                "sql_query": sql_query,
+                "answer": f"Here are the top {top_n} {product} {role.lower()} by {metric_label.lower()}{period_label.lower()}:",
+                "query_type": "analytical",
+                "is_time_series": False,
+                "chart_title": f"Top {top_n} {product_title} {role} by {metric_label}{period_label}",
+            }
+        elif intent["shape"] == "total_value":
+            sql_query = (
+                f"SELECT SUM(Total_Value_INR) AS TotalValue_INR, "
+                f"SUM(QUANTITY_KG) AS TotalQuantity_KG, "
+                f"SUM(Total_Value_INR) / NULLIF(SUM(QUANTITY_KG), 0) AS WeightedAvgPrice_INR "
+                f"FROM {view} {where_clause()}"
+            )
+            llm_data = {
+                "sql_query": sql_query,
+                "answer": f"Here is the total value of {product} {flow.lower()}{period_label.lower()}:",
+                "query_type": "analytical",
+                "is_time_series": False,
+                "chart_title": f"Total {product_title} {flow}{period_label}",
+            }
+        else:
+            month_expr = f"DATEFROMPARTS(YEAR({date_col}), MONTH({date_col}), 1)"
+            sql_query = (
+                f"SELECT {month_expr} AS Month, "
+                f"SUM(Total_Value_INR) AS Total_Value_INR, "
+                f"SUM(QUANTITY_KG) AS Total_Quantity_KG, "
+                f"SUM(Total_Value_INR) / NULLIF(SUM(QUANTITY_KG), 0) AS WeightedAvgPrice_INR "
+                f"FROM {view} {where_clause()} "
+                f"GROUP BY {month_expr} "
+                f"ORDER BY Month"
+            )
+            llm_data = {
+                "sql_query": sql_query,
+                "answer": f"Here is the monthly trend of {product} {flow.lower()}{period_label.lower()}:",
+                "query_type": "analytical",
+                "is_time_series": True,
+                "chart_title": f"Monthly {product_title} {flow} Trend{period_label}",
+            }
+
+        return llm_data, max(confidence, 0.0)
+
     # ============================================================
     # MAIN METHOD: Process User Query and Return Response
     # ============================================================
-    def ask(self, user_query, history=[]):
-        """Processes natural language queries and returns SQL results with insights"""
+    def ask(self, user_query, history=[], defer_insights=False, export_format=None):
+        """
+        Processes natural language queries and returns SQL results with insights.
+        With defer_insights=True the rows/chart metadata are returned as soon as the
+        SQL result is formatted, and the insights are generated in the background
+        under the returned 'insight_id' (see get_insights()).
+        export_format ('xlsx', 'csv', 'csv.gz', 'parquet') applies if the result
+        goes to a background export; defaults to EXPORT_FORMAT.
+        Per-stage timings of the call are available from get_last_timings().
+        """
+        _request_timings.stages = {}
+        prompt_started = time.perf_counter()
         
         # ============================================================
         # STEP 1: Check for Small Talk (Skip LLM if Casual Chat)
@@ -778,42 +1839,76 @@ COMPLETE DATASET STATISTICS (from all {safe_format('TotalRecords', ',')} records
         }}
         """
 
+        self._record_stage("prompt_build", prompt_started)
+
+        speculation = None  # SQL started early while the LLM was still streaming
         try:
             # ============================================================
-            # STEP 4: Generate SQL Query Using LLM
-            # ============================================================
-            print("--- Generating SQL from LLM ---")
-            llm_response = self.model.generate_content(prompt)
-            
-            # ============================================================
-            # STEP 5: Safety Check - Handle Empty/Invalid LLM Responses
+            # STEP 4: Generate SQL Query Using LLM (or reuse a cached translation)
             # ============================================================
-            try:
-                if not llm_response.candidates or not llm_response.candidates[0].content.parts:
-                    print("⚠️ Empty response from Gemini, retrying once...")
+            cache_key = self.translation_cache.make_key(user_query, history)
+            llm_data = self.translation_cache.get(cache_key)
+            from_cache = llm_data is not None
+
+            fast_path_data, fast_path_confidence = (None, 0.0) if from_cache else self._detect_common_intent(user_query)
+            from_fast_path = fast_path_data is not None and fast_path_confidence >= self.fast_path_min_confidence
+
+            template_data = None if (from_cache or from_fast_path) else self.template_store.match(user_query, history)
+            from_template = template_data is not None
+
+            if from_cache:
+                print("⚡ Translation cache hit - skipping LLM call")
+            elif from_fast_path:
+                print(f"⚡ Fast path matched (confidence {fast_path_confidence:.2f}) - skipping LLM call")
+                llm_data = fast_path_data
+            elif from_template:
+                print("⚡ Learned SQL template matched - skipping LLM call")
+                llm_data = template_data
+            else:
+                if fast_path_data is not None:
+                    print(f"--- Fast path confidence {fast_path_confidence:.2f} below threshold, asking the LLM ---")
+                llm_text = ""
+                if self.speculative_sql:
+                    # Stream the JSON and start the SQL as soon as "sql_query" is complete
+                    print("--- Generating SQL from LLM (streaming, speculative execution) ---")
+                    llm_text, speculation = self._generate_sql_speculatively(prompt)
+
+                if not llm_text:
+                    print("--- Generating SQL from LLM ---")
+                    llm_started = time.perf_counter()
                     llm_response = self.model.generate_content(prompt)
-                    if not llm_response.candidates or not llm_response.candidates[0].content.parts:
-                        print("⚠️ Gemini returned empty response even after retry.")
-                        return {"answer": "I'm sorry, I couldn't process that question right now. Please try rephrasing it.", "data": [], "query": ""}
                 
-                llm_text = getattr(llm_response, "text", "").strip()
-                if not llm_text:
-                    print("⚠️ Gemini produced no text output.")
-                    return {"answer": "I couldn't generate a response for that question. Please try again.", "data": [], "query": ""}
-
+                    # ============================================================
+                    # STEP 5: Safety Check - Handle Empty/Invalid LLM Responses
+                    # ============================================================
+                    try:
+                        if not llm_response.candidates or not llm_response.candidates[0].content.parts:
+                            print("⚠️ Empty response from Gemini, retrying once...")
+                            llm_response = self.model.generate_content(prompt)
+                            if not llm_response.candidates or not llm_response.candidates[0].content.parts:
+                                print("⚠️ Gemini returned empty response even after retry.")
+                                return {"answer": "I'm sorry, I couldn't process that question right now. Please try rephrasing it.", "data": [], "query": ""}
+                    
+                        llm_text = getattr(llm_response, "text", "").strip()
+                        if not llm_text:
+                            print("⚠️ Gemini produced no text output.")
+                            return {"answer": "I couldn't generate a response for that question. Please try again.", "data": [], "query": ""}
+
+                    except Exception as inner_e:
+                        print(f"⚠️ Error accessing Gemini response: {repr(inner_e)}")
+                        return {"answer": "I'm sorry, I ran into a temporary issue while processing your question.", "data": [], "query": ""}
+                    finally:
+                        self._record_stage("llm", llm_started)
+
+                # ============================================================
+                # STEP 6: Parse LLM Response as JSON
+                # ============================================================
                 cleaned_json_str = self._clean_llm_response(llm_text)
+                if not cleaned_json_str:
+                    raise Exception(f"LLM did not return valid JSON. Response: {repr(llm_text)}")
 
-            except Exception as inner_e:
-                print(f"⚠️ Error accessing Gemini response: {repr(inner_e)}")
-                return {"answer": "I'm sorry, I ran into a temporary issue while processing your question.", "data": [], "query": ""}
+                llm_data = json.loads(cleaned_json_str)
 
-            # ============================================================
-            # STEP 6: Parse LLM Response as JSON
-            # ============================================================
-            if not cleaned_json_str:
-                raise Exception(f"LLM did not return valid JSON. Response: {repr(llm_response.text)}")
-
-            llm_data = json.loads(cleaned_json_str)
             sql_query = llm_data.get("sql_query")
             answer = llm_data.get("answer", "I found some data for you.")
             chart_title = llm_data.get("chart_title", "")
@@ -847,113 +1942,125 @@ COMPLETE DATASET STATISTICS (from all {safe_format('TotalRecords', ',')} records
             # STEP 8: Execute SQL Query with Auto-Retry Fallback
             # ============================================================
             print(f"--- Executing SQL safely ---")
-            
-            def try_execute_sql(query, conn):
-                try:
-                    result = conn.execute(text(query))
-                    return result
-                except Exception as e:
-                    if "Invalid column" in str(e) or "Syntax" in str(e):
-                        print("⚠️ LLM might have used '=' instead of LIKE. Retrying with LIKE...")
-                        query_like = re.sub(r"(Importer_Name|Exporter_Name|Product_Name)\s*=\s*'([^']+)'", r"\1 LIKE '%\2%'", query)
-                        print(f"🔄 Retrying modified SQL:\n{query_like}\n")
-                        return conn.execute(text(query_like))
-                    else:
-                        raise
 
-            with self.engine.connect() as conn:
+            # Reuse a cached result if the same SQL already ran against the current data
+            result_key = ResultCache.normalize_sql(sql_query)
+            watermark = self._get_data_watermark(sql_query)
+            cached_result = self.result_cache.get(result_key, watermark) if watermark is not None else None
+
+            if speculation is not None and speculation.sql_query != sql_query:
+                # The final JSON disagreed with what we started early - throw it away
+                print("--- Speculative SQL does not match the final SQL, cancelling it ---")
+                speculation.cancel()
+                speculation = None
+
+            # Size up plain data pulls before fetching anything
+            plan = None
+            if cached_result is None and query_type == "data_pull":
+                plan = self._plan_data_pull(sql_query)
+
+            if speculation is not None and plan and plan["mode"] in ("preview", "export"):
+                # The speculative run reads up to INLINE_ROW_LIMIT + 1 rows - a preview
+                # only needs PREVIEW_ROWS of them and an export none in this thread
+                print(f"--- Cancelling speculative SQL ({plan['mode']} of {plan['row_count']:,} rows) ---")
+                speculation.cancel()
+                speculation = None
+
+            if plan and plan["mode"] == "export":
+                # Too big to touch in the request thread - hand it to the export job right away
+                job_id = self._start_export_job(sql_query, export_format, expected_rows=plan["row_count"])
+                export_label = EXPORT_FORMATS[export_format or self.export_format]['label']
+                export_note = f"⏳ The dataset contains **{plan['row_count']:,} rows**, which is too large to show here. I am preparing a downloadable {export_label} file..."
+                return {
+                    "answer": f"{answer}\n\n{export_note}",
+                    "data": [],
+                    "query": sql_query,
+                    "chart_title": chart_title,
+                    "export_job_id": job_id,
+                    "insight_id": None,
+                    "row_count": plan["row_count"],
+                    "query_type": query_type,
+                    "is_time_series": is_time_series
+                }
+
+            if cached_result is not None:
+                print("⚡ Result cache hit - skipping SQL execution")
+                data_for_viz = cached_result["data"]
+                summary_stats = cached_result["summary_stats"]
+            else:
                 try:
-                    result = try_execute_sql(sql_query, conn)
-                    rows = result.fetchall()
-                    column_names = list(result.keys())
-
-                    formatted_rows = []
-                    for row in rows:
-                        new_row_dict = {}
-                        for i, val in enumerate(row):
-                            col_name = column_names[i]
-                            if isinstance(val, (datetime.date, datetime.datetime)):
-                                new_row_dict[col_name] = val.strftime('%d-%b-%Y')
-                            elif col_name in ('BE_Number', 'SB_Number') and val is not None:
-                                try:
-                                    new_row_dict[col_name] = f"{float(val):.0f}"
-                                except (ValueError, TypeError):
-                                    new_row_dict[col_name] = str(val)
-                            else:
-                                new_row_dict[col_name] = val
-                        formatted_rows.append(new_row_dict)
-                    data_for_viz = formatted_rows
-
-                    summary_query = self._generate_summary_query(sql_query)
-                    summary_stats = None
-                    if summary_query:
-                        summary_result = try_execute_sql(summary_query,conn)
-                        summary_rows = summary_result.fetchall()
-                        summary_column_names = summary_result.keys()
-                        summary_stats = [dict(zip(summary_column_names, row)) for row in summary_rows]
+                    if speculation is not None:
+                        print("⚡ Using speculatively started SQL execution")
+                        data_for_viz, summary_stats = speculation.result()
+                    elif plan and plan["mode"] == "preview":
+                        data_for_viz, summary_stats = self._execute_query_with_summary(sql_query, row_limit=self.preview_rows)
                     else:
-                        print("--- Skipping summary query (could not be generated) ---")
-
-                    row_count = len(data_for_viz)
-                    if row_count > 10000:   # Handle LARGE DATASETS
-                        job_id = str(int(time.time()))
-                        export_jobs[job_id] = {"status": "processing", "progress": 0, "file": None}
-                        def export_job():
-                            try:
-                                export_dir = "exports"
-                                os.makedirs(export_dir, exist_ok=True)
-                                filename = f"export_{job_id}.xlsx"
-                                file_path = os.path.join(export_dir, filename)
-                                df = pd.DataFrame(data_for_viz)
-                                with pd.ExcelWriter(file_path, engine='xlsxwriter', engine_kwargs={'options': {'strings_to_formulas': False}}) as writer:
-                                    df.to_excel(writer, index=False, sheet_name='Data')
-                                    workbook = writer.book
-                                    worksheet = writer.sheets['Data']
-                                    text_format = workbook.add_format({'num_format': '@'})
-                                    headers = df.columns.tolist()
-                                    try:
-                                        be_col_idx = headers.index('BE_Number')
-                                        worksheet.set_column(be_col_idx, be_col_idx, None, text_format)
-                                    except ValueError: pass
-                                    try:
-                                        hs_col_idx = headers.index('HS_Code')
-                                        worksheet.set_column(hs_col_idx, hs_col_idx, None, text_format)
-                                    except ValueError: pass
-                                export_jobs[job_id]["status"] = "ready"
-                                export_jobs[job_id]["progress"] = 100
-                                export_jobs[job_id]["file"] = filename
-                            except Exception as e:
-                                export_jobs[job_id]["status"] = "error"
-                                print("Export error:", e)
-                        Thread(target=export_job).start()
-                        
-                        # --- Pass query_type to insights ---
-                        insights = self._generate_insights(user_query, data_for_viz, summary_stats)
-
-                        return {
-                            "answer": f"{answer}\n\n{insights} \n\n⏳ The dataset contains **{row_count:,} rows**. I am preparing a downloadable Excel file...",
-                            "data": [],
-                            "query": sql_query,
-                            "chart_title": chart_title,
-                            "export_job_id": job_id,
-                            # --- NEW RETURN KEYS ---
-                            "query_type": query_type,
-                            "is_time_series": is_time_series
-                        }
-
+                        data_for_viz, summary_stats = self._execute_query_with_summary(sql_query)
                 except Exception as sql_error:
                     print(f"❌ SQL Execution Error: {sql_error}")
                     return {"answer": "I couldn't run the generated SQL query correctly. Please rephrase your question or try again.", "data": [], "query": sql_query}
 
+                # Large results (and previews) go to the export path and are not worth keeping in memory
+                if watermark is not None and len(data_for_viz) <= self.inline_row_limit and not (plan and plan["mode"] == "preview"):
+                    self.result_cache.put(result_key, {"data": data_for_viz, "summary_stats": summary_stats}, watermark)
+
+            # The SQL ran, so the translation is safe to replay next time
+            # (and, if its literals come from the question, to reuse as a template)
+            if not from_cache and not from_fast_path and not from_template:
+                self.translation_cache.put(cache_key, llm_data)
+                if self.template_store.learn(user_query, llm_data, sql_query, history):
+                    print("--- Learned a reusable SQL template from this query ---")
+
+            row_count = len(data_for_viz)
+            is_preview = plan is not None and plan["mode"] == "preview"
+            chart = self._build_chart(data_for_viz, is_time_series, query_type)
+            if row_count > self.inline_row_limit or is_preview:   # Handle LARGE DATASETS
+                if chart is not None:
+                    # Only the first rows were fetched - the full result goes to the export
+                    chart["partial"] = True
+                job_id = self._start_export_job(sql_query, export_format, expected_rows=plan["row_count"] if is_preview else None)
+                export_label = EXPORT_FORMATS[export_format or self.export_format]['label']
+                
+                if is_preview:
+                    export_note = f"⏳ The dataset contains **{plan['row_count']:,} rows**. Showing the first {self.preview_rows:,} here; I am preparing a downloadable {export_label} file with all of them..."
+                else:
+                    export_note = f"⏳ The dataset contains **more than {self.inline_row_limit:,} rows**. I am preparing a downloadable {export_label} file..."
+                if defer_insights:
+                    insight_id = self._start_insight_job(user_query, data_for_viz, summary_stats)
+                    export_answer = f"{answer}\n\n{export_note}"
+                else:
+                    # --- Pass query_type to insights ---
+                    insight_id = None
+                    insights = self._generate_insights(user_query, data_for_viz, summary_stats)
+                    export_answer = f"{answer}\n\n{insights} \n\n{export_note}"
+
+                export_response = {
+                    "answer": export_answer,
+                    "query": sql_query,
+                    "chart_title": chart_title,
+                    "export_job_id": job_id,
+                    "insight_id": insight_id,
+                    "chart": chart,
+                    # --- NEW RETURN KEYS ---
+                    "query_type": query_type,
+                    "is_time_series": is_time_series
+                }
+                return self._attach_result_page(export_response, data_for_viz[:self.preview_rows] if is_preview else [])
+
             # ============================================================
             # STEP 9: Post-Process Results Based on Query Type
             # ============================================================
             
-            print(f"--- Generating insights for {query_type} query ---")
-            insights = self._generate_insights(user_query, data_for_viz, summary_stats)
-
-            if insights:
-                answer = f"{answer}\n\n{insights}"
+            insight_id = None
+            if defer_insights:
+                # Phase 2: insights are delivered later via get_insights(insight_id)
+                insight_id = self._start_insight_job(user_query, data_for_viz, summary_stats)
+            else:
+                print(f"--- Generating insights for {query_type} query ---")
+                insights = self._generate_insights(user_query, data_for_viz, summary_stats)
+
+                if insights:
+                    answer = f"{answer}\n\n{insights}"
             
             if not data_for_viz:
                 print("--- Data result was empty. Overriding answer. ---")
@@ -963,14 +2070,16 @@ COMPLETE DATASET STATISTICS (from all {safe_format('TotalRecords', ',')} records
             # ============================================================
             # STEP 10: Return Structured Response
             # ============================================================
-            return {
+            response = {
                 "answer": answer,
-                "data": data_for_viz,
                 "query": sql_query,
                 "chart_title": chart_title,
+                "insight_id": insight_id,
+                "chart": chart,
                 "query_type": query_type, 
                 "is_time_series": is_time_series
             }
+            return self._attach_result_page(response, data_for_viz)
 
         except Exception as e:
             print(f"Error in agent.ask: {e}")
@@ -978,4 +2087,9 @@ COMPLETE DATASET STATISTICS (from all {safe_format('TotalRecords', ',')} records
                 "answer": "I'm sorry, I encountered a temporary issue while generating that insight. Please try rephrasing your question.",
                 "data": [],
                 "query": ""
-            }
\ No newline at end of file
+            }
+
+        finally:
+            # No-op if the speculative result was used; otherwise abandon it
+            if speculation is not None:
+                speculation.cancel()
\ No newline at end of file
@@ -1,11 +1,15 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from agent import QueryAgent
 import os
 from flask import send_from_directory
-from agent import export_jobs
+from formatting import to_columnar
+from json_provider import FastJSONProvider
+from compression import ResponseCompressor
+from exporter import normalize_export_format, export_mimetype
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson-backed; Decimal/date/numpy aware
 
 # Initialize the QueryAgent
 # This loads the .env file, connects to the DB, and sets up the LLM agent.
@@ -19,6 +23,13 @@ except Exception as e:
     # If the agent fails to load (e.g., DB connection), we can't run the app.
     query_agent = None
 
+# gzip/brotli for JSON, SSE and CSV responses (the .env is loaded by QueryAgent)
+compressor = ResponseCompressor(
+    app,
+    min_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")),
+    level=int(os.getenv("RESPONSE_COMPRESSION_LEVEL", "6")),
+)
+
 @app.route('/')
 def index():
     """
@@ -26,11 +37,22 @@ def index():
     """
     return render_template('index.html')
 
+def _apply_response_format(response, response_format):
+    """
+    Switches 'data' to the compact {columns, rows} format (plus 'column_meta')
+    when the client sent {"format": "columnar"}. Default stays a list of row objects.
+    """
+    if response_format == 'columnar' and isinstance(response.get('data'), list):
+        response['data'], response['column_meta'] = to_columnar(response['data'])
+        response['data_format'] = 'columnar'
+    return response
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """
     API endpoint to handle chat messages.
-    Takes a JSON request {'message': 'user_query'}
+    Takes a JSON request {'message': 'user_query'} (optional 'format': 'columnar',
+    'export_format': 'xlsx' | 'csv' | 'csv.gz' | 'parquet' for large results)
     Returns a JSON response from the QueryAgent.
     """
     if not query_agent:
@@ -44,7 +66,14 @@ def chat():
         return jsonify({"answer": "Error: No message provided.", "data": [], "query": ""}), 400
 
     try:
-        response = query_agent.ask(user_message, history)  # <-- 2. Pass history to the agent
+        export_format = normalize_export_format(data['export_format']) if data.get('export_format') else None
+    except ValueError as e:
+        return jsonify({"answer": f"Error: {e}", "data": [], "query": ""}), 400
+
+    try:
+        # <-- 2. Pass history to the agent. Insights are generated in the
+        # background so the data/chart can be returned right away.
+        response = query_agent.ask(user_message, history, defer_insights=True, export_format=export_format)
 
         # Handle the case where agent returns None or an unexpected type
         if not response or not isinstance(response, dict):
@@ -56,7 +85,7 @@ def chat():
                 "is_fact": False
             }), 500
 
-        return jsonify(response)
+        return jsonify(_apply_response_format(response, data.get('format')))
 
     except Exception as e:
         # Log safely without leaking API details
@@ -68,16 +97,158 @@ def chat():
             "is_fact": False
         }), 500
     
+def _sse_event(event, payload):
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {app.json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /api/chat (Server-Sent Events).
+    Emits a 'result' event with the data/SQL/chart metadata as soon as the SQL
+    result is ready, then 'insight' events carrying the analysis text chunks as
+    Gemini generates them, and finally 'done'.
+    """
+    data = request.json or {}
+    user_message = data.get('message')
+    history = data.get('history', [])
+    response_format = data.get('format')
+
+    def generate():
+        if not query_agent:
+            yield _sse_event("error", {"message": "The Query Agent is not initialized. Please check server logs."})
+            return
+        if not user_message:
+            yield _sse_event("error", {"message": "No message provided."})
+            return
+
+        try:
+            export_format = normalize_export_format(data['export_format']) if data.get('export_format') else None
+        except ValueError as e:
+            yield _sse_event("error", {"message": str(e)})
+            return
+
+        try:
+            response = query_agent.ask(user_message, history, defer_insights=True, export_format=export_format)
+            if not response or not isinstance(response, dict):
+                print("⚠️ QueryAgent returned an invalid response format.")
+                yield _sse_event("error", {"message": "I'm sorry, I couldn't process that question at the moment."})
+                return
+
+            yield _sse_event("result", _apply_response_format(response, response_format))
+
+            insight_id = response.get("insight_id")
+            if insight_id:
+                for chunk in query_agent.iter_insight_chunks(insight_id):
+                    yield _sse_event("insight", {"text": chunk})
+
+            yield _sse_event("done", {})
+
+        except Exception as e:
+            # Log safely without leaking API details
+            print(f"⚠️ Error during streamed agent query: {repr(e)}")
+            yield _sse_event("error", {"message": "I'm sorry, I encountered a temporary issue while generating that insight. Please try again."})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/api/insights/<insight_id>')
+def insights(insight_id):
+    """
+    Delivers the analysis text for a two-phase /api/chat response.
+    Long-polls: waits up to ?wait= seconds (default 20) for the insight to be ready.
+    """
+    if not query_agent:
+        return {"status": "not_initialized"}, 503
+
+    wait = min(request.args.get('wait', 20, type=float), 30)
+    job = query_agent.get_insights(insight_id, timeout=wait)
+    if not job:
+        return {"status": "not_found"}, 404
+    return job
+
+@app.route('/api/results/<result_id>')
+def results(result_id):
+    """
+    Serves one page of a result kept server-side by ask() (see 'result_id' in
+    the /api/chat response) without re-running the SQL.
+    Query params: offset, limit, sort (column name, '-' prefix for descending)
+    and format=columnar.
+    """
+    if not query_agent:
+        return {"status": "not_initialized"}, 503
+
+    try:
+        page = query_agent.get_result_page(
+            result_id,
+            offset=request.args.get('offset', 0, type=int),
+            limit=request.args.get('limit', type=int),
+            sort=request.args.get('sort') or None,
+        )
+    except ValueError as e:
+        return {"status": "bad_request", "message": str(e)}, 400
+    if page is None:
+        return {"status": "not_found"}, 404
+
+    page["result_id"] = result_id
+    page["data"] = page.pop("rows")
+    return _apply_response_format(page, request.args.get('format'))
+
+@app.route('/api/stats')
+def stats():
+    """
+    Returns cache hit/miss counters and other performance stats.
+    """
+    if not query_agent:
+        return {"status": "not_initialized"}, 503
+    return dict(query_agent.get_stats(), compression=compressor.stats())
+
 @app.route('/export_status/<job_id>')
 def export_status(job_id):
-    job = export_jobs.get(job_id, None)
+    if not query_agent:
+        return {"status": "not_initialized"}, 503
+    job = query_agent.get_export_job(job_id)
     if not job:
         return {"status": "not_found"}, 404
     return job
 
+@app.route('/export_status/<job_id>/stream')
+def export_status_stream(job_id):
+    """
+    Server-Sent Events for an export job: 'progress' events (the same fields
+    as /export_status) whenever the job advances, then 'ready' with the
+    download link or 'failed', and the stream ends. Subscribers block on a
+    Condition between updates, so idle streams cost no requests or CPU.
+    """
+    if not query_agent:
+        return {"status": "not_initialized"}, 503
+    if query_agent.get_export_job(job_id) is None:
+        return {"status": "not_found"}, 404
+
+    def generate():
+        for job in query_agent.iter_export_status(job_id):
+            if job is None:
+                yield ": keep-alive\n\n"
+            elif job["status"] == "ready":
+                yield _sse_event("ready", dict(job, download_url=f"/download/{job['file']}"))
+            elif job["status"] == "error":
+                yield _sse_event("failed", job)
+            else:
+                yield _sse_event("progress", job)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_from_directory("exports", filename, as_attachment=True)
+    # .csv.gz is served as application/gzip (not text/csv), so it isn't decoded or re-compressed on the way
+    return send_from_directory("exports", filename, as_attachment=True, mimetype=export_mimetype(filename))
 
 
 if __name__ == '__main__':
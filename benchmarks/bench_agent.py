@@ -0,0 +1,163 @@
+"""
+Offline benchmark for QueryAgent.ask().
+
+Runs the agent against a fake Gemini model (replaying recorded JSON from
+recorded_responses.json) and a local SQLite stand-in loaded with synthetic
+View_Clean_Imports / View_Clean_Exports rows, then reports per-stage timings
+and requests/sec under concurrency. No API key or SQL Server needed.
+
+    python benchmarks/bench_agent.py --rows 1000000 --requests 50 --concurrency 4
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_backend import FakeGeminiModel, build_database, load_recorded_responses, make_engine
+
+STAGES = ["prompt_build", "llm", "count", "sql", "row_formatting", "chart", "summary", "insights", "export"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark QueryAgent.ask() offline.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic rows per view (1M-50M)")
+    parser.add_argument("--db", default=None, help="SQLite file for the synthetic data (reused if the row count matches)")
+    parser.add_argument("--requests", type=int, default=50, help="Total ask() calls")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent ask() callers")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per Gemini call")
+    parser.add_argument("--responses", default=os.path.join(BENCH_DIR, "recorded_responses.json"))
+    parser.add_argument("--defer-insights", action="store_true", help="Benchmark the two-phase path (insights in the background)")
+    parser.add_argument("--enable-shortcuts", action="store_true",
+                        help="Keep the translation/result caches, learned templates and fast path on (off by default to measure the full hot path)")
+    parser.add_argument("--skip-exports", action="store_true", help="Don't wait for export jobs to finish")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def wait_for_export(query_agent, job_id, timeout=600):
+    """Seconds until the export job finished (ready or error)."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        job = query_agent.get_export_job(job_id)
+        if job and job.get("status") in ("ready", "error"):
+            break
+        time.sleep(0.05)
+    return time.perf_counter() - started
+
+
+def main():
+    args = parse_args()
+
+    if not args.enable_shortcuts:
+        os.environ["TRANSLATION_CACHE_SIZE"] = "0"
+        os.environ["RESULT_CACHE_MAX_MB"] = "0"
+        os.environ["SQL_TEMPLATE_STORE_SIZE"] = "0"
+        os.environ["FAST_PATH_MIN_CONFIDENCE"] = "2"
+
+    db_path = args.db or os.path.join(tempfile.gettempdir(), f"querysense_bench_{args.rows}.sqlite")
+    build_database(db_path, args.rows)
+
+    questions, responses, insight_text = load_recorded_responses(args.responses)
+    model = FakeGeminiModel(responses, insight_text, latency=args.llm_latency)
+    engine = make_engine(db_path, pool_size=max(8, args.concurrency * 2))
+
+    from agent import QueryAgent
+    query_agent = QueryAgent(model=model, engine=engine)
+
+    def run_one(i):
+        question = questions[i % len(questions)]
+        started = time.perf_counter()
+        response = query_agent.ask(question, [], defer_insights=args.defer_insights)
+        latency = time.perf_counter() - started
+        if response.get("insight_id"):
+            # Deferred insights record their stage time when the background job finishes
+            query_agent.get_insights(response["insight_id"], timeout=600)
+        timings = query_agent.get_last_timings()
+
+        if response.get("export_job_id") and not args.skip_exports:
+            timings["export"] = wait_for_export(query_agent, response["export_job_id"])
+
+        failed = not response.get("data")
+        return question, latency, timings, failed
+
+    print(f"\n--- Running {args.requests} requests with concurrency {args.concurrency} ---")
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(run_one, range(args.requests)))
+    wall = time.perf_counter() - wall_started
+
+    latencies = [r[1] for r in results]
+    report = {
+        "rows_per_view": args.rows,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "llm_latency": args.llm_latency,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(args.requests / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1),
+        },
+        "failed": sum(1 for r in results if r[3]),
+        "llm_calls": model.calls,
+        "stages_ms": {},
+        "per_question_p50_ms": {},
+    }
+
+    for stage in STAGES:
+        values = [r[2][stage] for r in results if stage in r[2]]
+        if values:
+            report["stages_ms"][stage] = {
+                "n": len(values),
+                "mean": round(statistics.mean(values) * 1000, 1),
+                "p50": round(percentile(values, 50) * 1000, 1),
+                "p95": round(percentile(values, 95) * 1000, 1),
+            }
+
+    for question in questions:
+        values = [r[1] for r in results if r[0] == question]
+        if values:
+            report["per_question_p50_ms"][question] = round(percentile(values, 50) * 1000, 1)
+
+    print("\n================= Benchmark Results =================")
+    print(f"Rows per view:    {args.rows:,}")
+    print(f"Requests:         {args.requests} (concurrency {args.concurrency}, {report['failed']} failed)")
+    print(f"Throughput:       {report['requests_per_second']} req/s over {report['wall_seconds']}s")
+    print(f"ask() latency:    p50 {report['latency_ms']['p50']} ms | p95 {report['latency_ms']['p95']} ms | max {report['latency_ms']['max']} ms")
+    print(f"LLM calls:        {model.calls}")
+    print("\nStage               n     mean ms    p50 ms    p95 ms")
+    for stage, values in report["stages_ms"].items():
+        print(f"{stage:<16} {values['n']:>4} {values['mean']:>11} {values['p50']:>9} {values['p95']:>9}")
+    print("\nPer question (p50 ms):")
+    for question, value in report["per_question_p50_ms"].items():
+        print(f"  {value:>9}  {question}")
+    print("=====================================================\n")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+    # Let background insight/export threads wind down before exiting
+    query_agent.query_executor.shutdown(wait=False)
+    query_agent.speculation_executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
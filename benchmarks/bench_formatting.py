@@ -0,0 +1,128 @@
+"""
+Row formatting benchmark: per-cell loop (previous implementation) vs. the
+column-wise formatter in formatting.py, on wide shipment rows.
+
+    python benchmarks/bench_formatting.py --rows 10000 100000 1000000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from formatting import format_rows
+
+COLUMNS = [
+    "BE_Date", "BE_Number", "Importer/Exporter_Name", "Formatted_Name", "Product_Name",
+    "Product", "HS_Code", "Country", "Port", "QUANTITY_KG", "Unit_Price_INR", "Total_Value_INR",
+]
+
+
+def make_rows(count, seed=7):
+    """Shipment-like rows: dates, float BE numbers, names, Decimals and some NULLs."""
+    rnd = random.Random(seed)
+    start = datetime.date(2021, 1, 1)
+    rows = []
+    for i in range(count):
+        quantity = round(rnd.uniform(10, 20000), 2)
+        price = Decimal(f"{rnd.uniform(50, 500):.2f}")
+        rows.append((
+            start + datetime.timedelta(days=rnd.randrange(1500)),
+            float(2_000_000 + i) if i % 97 else None,
+            f"COMPANY {rnd.randrange(5000):04d} PRIVATE LIMITED",
+            f"CO{rnd.randrange(5000):04d}",
+            rnd.choice(["ZINC OXIDE 99.5%", "STEEL COIL HR", "BASMATI RICE 1121", "COPPER CATHODE"]),
+            rnd.choice(["ZINCOXIDE", "STEELCOIL", "BASMATIRICE", "COPPERCATHODE"]),
+            str(rnd.randrange(28000000, 85000000)),
+            rnd.choice(["CHINA", "UAE", "USA", "GERMANY", None]),
+            rnd.choice(["NHAVA SHEVA", "MUNDRA", "CHENNAI"]),
+            quantity,
+            price,
+            float(price) * quantity,
+        ))
+    return rows
+
+
+def format_rows_per_cell(rows, column_names):
+    """The original loop from QueryAgent.ask(), kept here as the baseline."""
+    formatted_rows = []
+    for row in rows:
+        new_row_dict = {}
+        for i, val in enumerate(row):
+            col_name = column_names[i]
+            if isinstance(val, (datetime.date, datetime.datetime)):
+                new_row_dict[col_name] = val.strftime('%d-%b-%Y')
+            elif col_name in ('BE_Number', 'SB_Number') and val is not None:
+                try:
+                    new_row_dict[col_name] = f"{float(val):.0f}"
+                except (ValueError, TypeError):
+                    new_row_dict[col_name] = str(val)
+            else:
+                new_row_dict[col_name] = val
+        formatted_rows.append(new_row_dict)
+    return formatted_rows
+
+
+def format_rows_pandas(rows, column_names):
+    """pandas variant (DataFrame + per-column map + to_dict), for comparison."""
+    df = pd.DataFrame.from_records(rows, columns=column_names, coerce_float=False)
+    for col in df.columns:
+        if col == "BE_Date":
+            df[col] = df[col].map(lambda v: v.strftime('%d-%b-%Y') if v is not None else None)
+        elif col in ('BE_Number', 'SB_Number'):
+            df[col] = df[col].map(lambda v: f"{float(v):.0f}" if v is not None and v == v else None)
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def timed(fn, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(rows, COLUMNS)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark result row formatting.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows per fetchmany() batch, as in the agent")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    implementations = [
+        ("per-cell loop", format_rows_per_cell),
+        ("pandas", format_rows_pandas),
+        ("columnar", format_rows),
+    ]
+
+    print(f"{'rows':>10}  {'implementation':<15} {'best ms':>10} {'rows/s':>12} {'speedup':>8}")
+    for count in args.rows:
+        rows = make_rows(count)
+
+        def batched(fn):
+            def run(all_rows, column_names):
+                out = []
+                for start in range(0, len(all_rows), args.batch_size):
+                    out.extend(fn(all_rows[start:start + args.batch_size], column_names))
+                return out
+            return run
+
+        baseline_time, expected = timed(batched(format_rows_per_cell), rows, args.repeat)
+        for name, fn in implementations:
+            elapsed, result = (baseline_time, expected) if fn is format_rows_per_cell else timed(batched(fn), rows, args.repeat)
+            if result != expected:
+                print(f"{count:>10,}  {name:<15} output differs from the per-cell loop!")
+                continue
+            print(f"{count:>10,}  {name:<15} {elapsed * 1000:>10.1f} {count / elapsed:>12,.0f} {baseline_time / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
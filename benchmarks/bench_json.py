@@ -0,0 +1,91 @@
+"""
+JSON response benchmark: Flask's default jsonify vs. the orjson-backed
+FastJSONProvider from json_provider.py, on /api/chat-style responses whose
+rows carry Decimal aggregates, floats, text and dates.
+
+    python benchmarks/bench_json.py --rows 1000 10000 100000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from formatting import to_columnar
+from json_provider import FastJSONProvider, orjson
+
+
+def make_response(count, seed=11):
+    """An ask() response: formatted rows plus a Decimal-valued summary."""
+    rnd = random.Random(seed)
+    start = datetime.date(2021, 1, 1)
+    rows = []
+    for i in range(count):
+        quantity = Decimal(f"{rnd.uniform(100, 25000):.2f}")
+        rows.append({
+            "BE_Date": (start + datetime.timedelta(days=rnd.randrange(1500))).strftime('%d-%b-%Y'),
+            "BE_Number": f"{2_000_000 + i}",
+            "Importer/Exporter_Name": f"COMPANY {rnd.randrange(2000):04d} PRIVATE LIMITED",
+            "Product": rnd.choice(["ZINCOXIDE", "STEELCOIL", "BASMATIRICE", "COPPERCATHODE"]),
+            "HS_Code": str(rnd.randrange(28000000, 85000000)),
+            "QUANTITY_KG": quantity,
+            "Unit_Price_INR": round(rnd.uniform(40, 400), 2),
+            "Total_Value_INR": quantity * Decimal(rnd.randrange(40, 400)),
+            "Last_Shipment": start + datetime.timedelta(days=rnd.randrange(1500)),
+        })
+    return {
+        "answer": f"Found {count} shipments.",
+        "query": "SELECT * FROM View_Clean_Imports WHERE Product LIKE '%ZINC%'",
+        "query_type": "data_pull",
+        "summary": {"Total_Shipments": count, "Total_Value_INR": sum(r["Total_Value_INR"] for r in rows)},
+        "data": rows,
+    }
+
+
+def timed(app, payload, repeat):
+    best, body = None, b""
+    with app.app_context():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = app.json.response(payload).get_data()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding of chat responses.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed - FastJSONProvider falls back to the json module (pip install orjson)")
+
+    default_app = Flask("bench_default")
+    default_app.json = DefaultJSONProvider(default_app)
+    fast_app = Flask("bench_fast")
+    fast_app.json = FastJSONProvider(fast_app)
+
+    print(f"{'rows':>9}  {'shape':<9} {'encoder':<10} {'best ms':>9} {'KB':>9} {'speedup':>8}")
+    for count in args.rows:
+        response = make_response(count)
+        columnar = dict(response)
+        columnar["data"], columnar["column_meta"] = to_columnar(response["data"])
+
+        for shape, payload in (("records", response), ("columnar", columnar)):
+            baseline, _ = timed(default_app, payload, args.repeat)
+            for name, app in (("jsonify", default_app), ("fast", fast_app)):
+                elapsed, body = (baseline, timed(default_app, payload, 1)[1]) if app is default_app else timed(app, payload, args.repeat)
+                print(f"{count:>9,}  {shape:<9} {name:<10} {elapsed * 1000:>9.1f} {len(body) / 1024:>9.0f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
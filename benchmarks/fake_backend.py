@@ -0,0 +1,225 @@
+import datetime
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+import types
+
+from sqlalchemy import create_engine, event
+
+
+# ============================================================
+# Fake Gemini Model (replays recorded responses)
+# ============================================================
+class _FakeResponse:
+    """Mimics the parts of a google.generativeai response the agent reads."""
+
+    def __init__(self, text):
+        self.text = text
+        self.candidates = [types.SimpleNamespace(content=types.SimpleNamespace(parts=[text]))]
+
+
+class FakeGeminiModel:
+    """
+    Deterministic stand-in for genai.GenerativeModel.
+
+    NL -> SQL prompts are answered with the recorded JSON for the question
+    found after "NEWEST question is:", insight prompts with the recorded
+    insight text. `latency` seconds are spent per call (spread over the
+    chunks when stream=True) to approximate the real network round trip.
+    """
+
+    def __init__(self, responses, insight_text, latency=0.0, chunk_size=24):
+        self.responses = responses
+        self.insight_text = insight_text
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def _reply_for(self, prompt):
+        if "You are a business analyst" in prompt:
+            return self.insight_text
+        match = re.search(r'NEWEST question is:\s*"(.*?)"\s*\n', prompt, re.DOTALL)
+        if not match or match.group(1) not in self.responses:
+            raise KeyError(f"No recorded response for prompt question: {match.group(1) if match else '?'}")
+        return self.responses[match.group(1)]
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        reply = self._reply_for(prompt)
+        if not stream:
+            time.sleep(self.latency)
+            return _FakeResponse(reply)
+        return self._stream(reply)
+
+    def _stream(self, reply):
+        chunks = [reply[i:i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)] or [""]
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield _FakeResponse(chunk)
+
+
+def load_recorded_responses(path):
+    """Returns (questions, responses, insight_text) from the recorded JSON file."""
+    with open(path, encoding="utf-8") as f:
+        recorded = json.load(f)
+    responses = {}
+    questions = []
+    for item in recorded["queries"]:
+        questions.append(item["question"])
+        responses[item["question"]] = json.dumps(item["response"])
+    return questions, responses, recorded["insights"]
+
+
+# ============================================================
+# SQLite Stand-in for the SQL Server Views
+# ============================================================
+PRODUCTS = [
+    "ZINC OXIDE", "ZINC DUST", "STEEL COIL", "BASMATI RICE",
+    "ALUMINIUM INGOT", "COPPER CATHODE", "CASHEW KERNEL", "DIMER FATTY ACID",
+]
+
+VIEWS = {
+    "View_Clean_Imports": ("BE_Date", "BE_Number"),
+    "View_Clean_Exports": ("SB_Date", "SB_Number"),
+}
+
+
+def _columns(date_col, number_col):
+    return [
+        (date_col, "DATE"),
+        (number_col, "REAL"),
+        ("Importer/Exporter_Name", "VARCHAR"),
+        ("Formatted_Name", "VARCHAR"),
+        ("Product_Name", "VARCHAR"),
+        ("Product", "VARCHAR"),
+        ("HS_Code", "VARCHAR"),
+        ("Total_Value_INR", "FLOAT"),
+        ("QUANTITY_KG", "FLOAT"),
+    ]
+
+
+def tsql_to_sqlite(statement):
+    """Rewrites the T-SQL constructs the agent generates into SQLite syntax."""
+    statement = re.sub(r'\bCOUNT_BIG\(', 'COUNT(', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'CAST\(([^()]+?) AS DATE\)', r'DATE(\1)', statement, flags=re.IGNORECASE)
+
+    # SELECT TOP n ... -> SELECT ... LIMIT n (at the end of that SELECT's scope)
+    while True:
+        match = re.search(r'SELECT\s+TOP\s*(\(\s*:?\w+\s*\)|\d+)\s', statement, re.IGNORECASE)
+        if not match:
+            break
+        limit = match.group(1).strip('() ')
+        depth, end = 0, len(statement)
+        for i in range(match.end(), len(statement)):
+            ch = statement[i]
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                if depth == 0:
+                    end = i
+                    break
+                depth -= 1
+            elif ch == ';' and depth == 0:
+                end = i
+                break
+        statement = statement[:match.start()] + 'SELECT ' + statement[match.end():end] + f' LIMIT {limit} ' + statement[end:]
+    return statement
+
+
+def make_engine(db_path, pool_size=16):
+    """SQLAlchemy engine on the synthetic SQLite file that understands the agent's T-SQL."""
+    sqlite3.register_converter("DATE", lambda b: datetime.date.fromisoformat(b.decode()[:10]))
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        paramstyle="named",
+        pool_size=pool_size,
+        connect_args={"detect_types": sqlite3.PARSE_DECLTYPES, "check_same_thread": False},
+    )
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_conn, _record):
+        dbapi_conn.create_function("DATEFROMPARTS", 3, lambda y, m, d: f"{int(y):04d}-{int(m):02d}-{int(d):02d}", deterministic=True)
+        dbapi_conn.create_function("GETDATE", 0, lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        dbapi_conn.create_function("YEAR", 1, lambda d: int(str(d)[:4]) if d else None, deterministic=True)
+        dbapi_conn.create_function("MONTH", 1, lambda d: int(str(d)[5:7]) if d else None, deterministic=True)
+
+        # INFORMATION_SCHEMA.COLUMNS, so the agent's schema loader works unchanged
+        dbapi_conn.execute("ATTACH DATABASE ':memory:' AS INFORMATION_SCHEMA")
+        dbapi_conn.execute("CREATE TABLE INFORMATION_SCHEMA.COLUMNS (TABLE_NAME TEXT, COLUMN_NAME TEXT, DATA_TYPE TEXT)")
+        for view, (date_col, number_col) in VIEWS.items():
+            dbapi_conn.executemany(
+                "INSERT INTO INFORMATION_SCHEMA.COLUMNS VALUES (?, ?, ?)",
+                [(view, name, sql_type.lower()) for name, sql_type in _columns(date_col, number_col)],
+            )
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def rewrite_tsql(_conn, _cursor, statement, parameters, _context, _executemany):
+        return tsql_to_sqlite(statement), parameters
+
+    return engine
+
+
+def build_database(db_path, rows, seed=42, batch_size=200_000):
+    """
+    Creates View_Clean_Imports / View_Clean_Exports with `rows` synthetic rows
+    each (dates spread over the last four years). An existing file with the
+    same row count is reused.
+    """
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            existing = conn.execute("SELECT COUNT(*) FROM View_Clean_Imports").fetchone()[0]
+        except sqlite3.Error:
+            existing = None
+        conn.close()
+        if existing == rows:
+            print(f"--- Reusing synthetic database {db_path} ({rows:,} rows per view) ---")
+            return
+        os.remove(db_path)
+
+    print(f"--- Building synthetic database {db_path} ({rows:,} rows per view) ---")
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    rnd = random.Random(seed)
+    companies = [f"COMPANY {i:04d} PRIVATE LIMITED" for i in range(2000)]
+    end_date = datetime.date.today()
+    start_date = end_date.replace(year=end_date.year - 4)
+    span_days = (end_date - start_date).days
+
+    for view, (date_col, number_col) in VIEWS.items():
+        columns = _columns(date_col, number_col)
+        conn.execute(f"CREATE TABLE {view} ({', '.join(f'[{name}] {sql_type}' for name, sql_type in columns)})")
+        insert = f"INSERT INTO {view} VALUES ({', '.join('?' for _ in columns)})"
+
+        for batch_start in range(0, rows, batch_size):
+            batch = []
+            for i in range(batch_start, min(rows, batch_start + batch_size)):
+                product = rnd.choice(PRODUCTS)
+                company = companies[int(rnd.paretovariate(1.2)) % len(companies)]
+                quantity = round(rnd.uniform(100, 25_000), 2)
+                batch.append((
+                    (start_date + datetime.timedelta(days=rnd.randrange(span_days))).isoformat(),
+                    float(1_000_000 + i),
+                    company,
+                    company.split()[1],
+                    f"{product} GRADE {rnd.randrange(1, 5)}",
+                    product.replace(" ", ""),
+                    str(rnd.randrange(28000000, 85000000)),
+                    round(quantity * rnd.uniform(40, 400), 2),
+                    quantity,
+                ))
+            conn.executemany(insert, batch)
+            print(f"    {view}: {min(rows, batch_start + batch_size):,} / {rows:,}")
+
+        conn.execute(f"CREATE INDEX IX_{view}_Date ON {view} ({date_col})")
+        conn.execute(f"CREATE INDEX IX_{view}_Product ON {view} (Product, {date_col})")
+        conn.commit()
+
+    conn.close()
+    print(f"--- Synthetic database ready in {time.perf_counter() - started:.1f}s ---")
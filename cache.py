@@ -0,0 +1,193 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class TranslationCache:
+    """
+    Thread-safe LRU cache (with TTL) for parsed NL -> SQL translations.
+
+    Entries are keyed on the normalized user question plus the last few
+    conversation turns, and hold the parsed LLM JSON (sql_query, query_type,
+    is_time_series, chart_title, answer) so repeated questions skip the
+    Gemini round trip entirely.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=3600, history_turns=2):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.history_turns = history_turns
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+        # Counters (exposed through stats())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize_question(text):
+        """Lowercases, collapses whitespace and strips trailing punctuation."""
+        text = re.sub(r'\s+', ' ', str(text or '')).strip().lower()
+        return text.rstrip('?.! ')
+
+    def make_key(self, user_query, history=None):
+        """Builds the cache key from the question and the last N history turns."""
+        parts = [self.normalize_question(user_query)]
+        if history and self.history_turns > 0:
+            for turn in history[-self.history_turns:]:
+                role = "user" if turn.get('role') == 'user' else "agent"
+                parts.append(f"{role}:{self.normalize_question(turn.get('content', ''))}")
+        return "\n".join(parts)
+
+    def get(self, key):
+        """Returns a copy of the cached value, or None on a miss/expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key, value):
+        """Stores a copy of the value, evicting the least recently used entries."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache for executed SQL results, bounded by total bytes.
+
+    Entries are keyed on the normalized final SQL text and hold the formatted
+    rows plus the summary statistics. Each entry remembers the data watermark
+    (latest BE_Date/SB_Date) it was computed against; once the watermark
+    advances the entry is treated as stale and dropped.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (watermark, size, value)
+        self._lock = threading.Lock()
+
+        # Counters (exposed through stats())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize_sql(sql):
+        """Collapses whitespace and uppercases everything outside string literals."""
+        parts = re.split(r"('(?:[^']|'')*')", str(sql or '').strip().rstrip(';'))
+        normalized = []
+        for i, part in enumerate(parts):
+            if i % 2:  # Quoted literal - keep exactly as written
+                normalized.append(part)
+            else:
+                normalized.append(re.sub(r'\s+', ' ', part).upper())
+        return ''.join(normalized).strip()
+
+    @staticmethod
+    def estimate_size(value):
+        """Rough byte size of a cached result, extrapolated from a sample of rows."""
+        rows = value.get("data") or []
+        sample = rows[:100]
+        size = len(json.dumps(sample, default=str))
+        if sample:
+            size = int(size * len(rows) / len(sample))
+        size += len(json.dumps(value.get("summary_stats"), default=str))
+        return size
+
+    def get(self, key, watermark):
+        """Returns the cached value if present and computed against the same watermark."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry_watermark, size, value = entry
+            if entry_watermark != watermark:
+                del self._entries[key]
+                self.current_bytes -= size
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, watermark):
+        """Stores a result, evicting least recently used entries to stay under max_bytes."""
+        size = self.estimate_size(value)
+        if size > self.max_bytes:
+            return  # Never let one huge result flush the whole cache
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (watermark, size, value)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,333 @@
+import datetime
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+from formatting import format_date
+
+
+# Preferred x-axis columns for time series, in order
+DATE_COLUMNS = ('BE_Date', 'SB_Date')
+
+GRANULARITIES = ('daily', 'weekly', 'monthly')
+
+_NUMBER_TYPES = (int, float, Decimal)
+
+# Calendar-part columns (Year, Month, ...) are numeric but never summed or plotted
+_CALENDAR_COLUMN_WORDS = {'year', 'years', 'yr', 'month', 'months', 'quarter', 'qtr', 'week', 'weeks', 'day', 'days', 'weekday'}
+
+# Measures that are averaged (not summed) when rows are merged into one bucket
+_AVERAGED_MEASURE_HINTS = ('avg', 'average', 'price', 'rate', 'percent', 'share')
+
+
+@lru_cache(maxsize=16384)
+def _parse_date_text(value):
+    for fmt in ('%d-%b-%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m', '%b-%Y'):
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value):
+    """date for date/datetime values and date strings ("05-Mar-2024", "Mar-2024", ISO), else None."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str) and 7 <= len(value) <= 19:
+        return _parse_date_text(value)
+    return None
+
+
+def find_date_column(rows):
+    """BE_Date/SB_Date if present, otherwise the first column whose values are all dates."""
+    columns = list(rows[0].keys())
+    for name in DATE_COLUMNS:
+        if name in columns:
+            return name
+    sample = rows[:50]
+    for name in columns:
+        values = [row[name] for row in sample if row[name] is not None]
+        if values and all(parse_date(v) is not None for v in values):
+            return name
+    return None
+
+
+def find_measure_columns(rows, skip):
+    """Numeric columns worth plotting (ids, codes and Year/Month/... parts excluded)."""
+    measures = []
+    sample = rows[:50]
+    for name in rows[0].keys():
+        lowered = name.lower()
+        if name == skip or 'id' in lowered or 'code' in lowered:
+            continue
+        if _CALENDAR_COLUMN_WORDS.intersection(re.split(r'[^a-z]+', lowered)):
+            continue
+        values = [row[name] for row in sample if row[name] is not None]
+        if values and all(isinstance(v, _NUMBER_TYPES) and not isinstance(v, bool) for v in values):
+            measures.append(name)
+    return measures
+
+
+# ============================================================
+# Time Bucketing
+# ============================================================
+def bucket_start(day, granularity):
+    if granularity == 'weekly':
+        return day - datetime.timedelta(days=day.weekday())  # Monday
+    if granularity == 'monthly':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_label(day, granularity):
+    return day.strftime('%b-%Y') if granularity == 'monthly' else format_date(day)
+
+
+def native_granularity(days):
+    """Granularity the rows already have: monthly rows stay monthly, etc."""
+    gaps = [(b - a).days for a, b in zip(days, days[1:]) if b > a]
+    smallest = min(gaps) if gaps else 1
+    if smallest >= 28:
+        return 'monthly'
+    if smallest >= 7:
+        return 'weekly'
+    return 'daily'
+
+
+def choose_granularity(days, max_points):
+    """
+    Finest granularity whose bucket count over the date span fits max_points,
+    never finer than the data itself.
+    """
+    span_days = (days[-1] - days[0]).days + 1
+    if span_days <= max_points:
+        by_span = 'daily'
+    elif span_days / 7 <= max_points:
+        by_span = 'weekly'
+    else:
+        by_span = 'monthly'
+    native = native_granularity(days)
+    return max(by_span, native, key=GRANULARITIES.index)
+
+
+def _is_averaged(measure):
+    lowered = measure.lower()
+    return any(hint in lowered for hint in _AVERAGED_MEASURE_HINTS)
+
+
+# ============================================================
+# Downsampling (Largest-Triangle-Three-Buckets)
+# ============================================================
+def lttb_indices(xs, ys, threshold):
+    """
+    Indices of the points kept by LTTB: first and last always, and per
+    bucket the point forming the largest triangle with its neighbours -
+    keeps the peaks and dips a plain every-Nth sample would lose.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        else:
+            count = next_end - next_start
+            avg_x = sum(xs[next_start:next_end]) / count
+            avg_y = sum(ys[next_start:next_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, min(end, n - 1)):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
+
+
+# ============================================================
+# Chart Payload
+# ============================================================
+def build_time_series_chart(rows, max_points=500):
+    """
+    Chart-ready series for a time series result:
+    {"type": "time_series", "label_column", "granularity", "labels",
+     "series": [{"name", "values"}], "source_points", "points", "downsampled"}.
+    Rows are bucketed by day/week/month depending on the date span (sums,
+    averages for price/rate columns) and, if still above max_points,
+    reduced with LTTB. "partial" is set by callers that only had part of the
+    result. Returns None when there is no date or measure column, or when the
+    rows are broken down by something else too (BE_Date + company): summing
+    them per bucket would lose the breakdown, so the frontend charts the rows.
+    """
+    if not rows:
+        return None
+    date_column = find_date_column(rows)
+    if date_column is None:
+        return None
+    breakdown_column = find_label_column(rows, skip=(date_column,))
+    if breakdown_column is not None and len({row[breakdown_column] for row in rows}) > 1:
+        return None
+    measures = find_measure_columns(rows, skip=date_column)
+    if not measures:
+        return None
+
+    dated = [(parse_date(row[date_column]), row) for row in rows]
+    dated = sorted((item for item in dated if item[0] is not None), key=lambda item: item[0])
+    if not dated:
+        return None
+
+    days = [day for day, _ in dated]
+    granularity = choose_granularity(days, max_points)
+
+    # Merge rows into buckets: {bucket: {measure: [sum, count]}}
+    buckets = {}
+    for day, row in dated:
+        totals = buckets.setdefault(bucket_start(day, granularity), {m: [0.0, 0] for m in measures})
+        for measure in measures:
+            value = row[measure]
+            if value is not None:
+                totals[measure][0] += float(value)
+                totals[measure][1] += 1
+
+    keys = sorted(buckets)
+    series = {}
+    for measure in measures:
+        averaged = _is_averaged(measure)
+        values = []
+        for key in keys:
+            total, count = buckets[key][measure]
+            if not count:
+                values.append(None)
+            else:
+                values.append(total / count if averaged else total)
+        series[measure] = values
+
+    indices = list(range(len(keys)))
+    if len(keys) > max_points:
+        xs = [key.toordinal() for key in keys]
+        ys = [v or 0.0 for v in series[measures[0]]]
+        indices = lttb_indices(xs, ys, max_points)
+
+    return {
+        "type": "time_series",
+        "label_column": date_column,
+        "granularity": granularity,
+        "labels": [bucket_label(keys[i], granularity) for i in indices],
+        "series": [{"name": m, "values": [series[m][i] for i in indices]} for m in measures],
+        "source_points": len(rows),
+        "points": len(indices),
+        "downsampled": len(indices) < len(keys),
+        "partial": False,
+    }
+
+
+# ============================================================
+# Categorical Charts (Top K + "Others")
+# ============================================================
+def find_label_column(rows, skip=()):
+    """First text column that isn't a date, id, code or document number."""
+    sample = rows[:50]
+    for name in rows[0].keys():
+        lowered = name.lower()
+        if name in skip or 'id' in lowered or 'code' in lowered or 'number' in lowered:
+            continue
+        values = [row[name] for row in sample if row[name] is not None]
+        if values and all(isinstance(v, str) for v in values) and not all(parse_date(v) for v in values):
+            return name
+    return None
+
+
+def _find_column(columns, *hints):
+    for name in columns:
+        lowered = name.lower()
+        if any(hint in lowered for hint in hints) and not _is_averaged(name):
+            return name
+    return None
+
+
+def build_category_chart(rows, top_k=15, others_label="Others"):
+    """
+    Chart-ready series for a grouped result: the top_k labels by the first
+    measure (value columns preferred) plus one "Others" bucket holding the
+    rest. Rows sharing a label are merged first. Summed measures are summed
+    into Others; price/rate columns get the weighted value/quantity ratio
+    when both columns are present, else None.
+    Returns {"type": "category", "label_column", "labels", "series",
+    "source_points", "points", "others_count"} or None.
+    """
+    if not rows:
+        return None
+    label_column = find_label_column(rows)
+    if label_column is None:
+        return None
+    measures = find_measure_columns(rows, skip=label_column)
+    if not measures:
+        return None
+
+    ranking = _find_column(measures, 'value') or next((m for m in measures if not _is_averaged(m)), measures[0])
+    value_column = _find_column(measures, 'value')
+    quantity_column = _find_column(measures, 'quantity', 'qty', '_kg')
+
+    # Merge duplicate labels: {label: {measure: [sum, count]}}, first-seen order
+    groups = {}
+    for row in rows:
+        totals = groups.setdefault(row[label_column], {m: [0.0, 0] for m in measures})
+        for measure in measures:
+            value = row[measure]
+            if value is not None:
+                totals[measure][0] += float(value)
+                totals[measure][1] += 1
+
+    def measure_value(totals, measure):
+        total, count = totals[measure]
+        if not count:
+            return None
+        return total / count if _is_averaged(measure) else total
+
+    labels = list(groups)
+    others = []
+    if len(labels) > top_k + 1:   # an "Others" of a single label would just hide it
+        labels.sort(key=lambda label: groups[label][ranking][0], reverse=True)
+        labels, others = labels[:top_k], labels[top_k:]
+
+    series = []
+    for measure in measures:
+        values = [measure_value(groups[label], measure) for label in labels]
+        if others:
+            if not _is_averaged(measure):
+                values.append(sum(groups[label][measure][0] for label in others))
+            elif value_column and quantity_column:
+                value_sum = sum(groups[label][value_column][0] for label in others)
+                quantity_sum = sum(groups[label][quantity_column][0] for label in others)
+                values.append(value_sum / quantity_sum if quantity_sum else None)
+            else:
+                values.append(None)
+        series.append({"name": measure, "values": values})
+
+    return {
+        "type": "category",
+        "label_column": label_column,
+        "labels": [str(label) for label in labels] + ([others_label] if others else []),
+        "series": series,
+        "source_points": len(rows),
+        "points": len(labels) + (1 if others else 0),
+        "others_count": len(others),
+        "partial": False,
+    }
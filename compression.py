@@ -0,0 +1,189 @@
+import gzip
+import threading
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional - gzip is used when brotli isn't installed
+    brotli = None
+
+
+# Text-like responses worth compressing (xlsx/parquet downloads are compressed already)
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "text/event-stream",
+    "text/html",
+    "text/plain",
+    "text/csv",
+    "text/css",
+    "application/javascript",
+}
+
+
+def parse_accept_encoding(header):
+    """Returns {encoding: q} from an Accept-Encoding header."""
+    encodings = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name] = q
+    return encodings
+
+
+class _StreamCompressor:
+    """Incremental gzip/brotli compressor with a common interface."""
+
+    def __init__(self, encoding, level, brotli_quality):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def compress(self, data, flush=False):
+        """Compresses a chunk; flush=True makes everything so far decodable by the client."""
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + self._compressor.flush() if flush else out
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class ResponseCompressor:
+    """
+    after_request hook that gzip/brotli-compresses API responses.
+
+    - Bodies under `min_size` bytes are sent as-is.
+    - Other bodies are compressed in one go in the request thread (zlib and
+      brotli release the GIL, so other requests keep running meanwhile).
+    - Streamed responses (SSE, file downloads) are compressed on the fly;
+      every Server-Sent Event is flushed so the browser sees it immediately.
+    """
+
+    def __init__(self, app=None, min_size=1024, level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+
+        # Counters (exposed through stats())
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.by_encoding = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    # ============================================================
+    # Encoding Negotiation
+    # ============================================================
+    def choose_encoding(self, accept_encoding):
+        """'br' if the client accepts it and brotli is installed, else 'gzip', else None."""
+        accepted = parse_accept_encoding(accept_encoding)
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", accepted.get("*", 0)) > 0:
+            return "gzip"
+        return None
+
+    # ============================================================
+    # after_request Hook
+    # ============================================================
+    def compress_response(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or request.method == "HEAD"):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = self.choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            flush_each = response.mimetype == "text/event-stream"
+            response.direct_passthrough = False
+            response.response = self._compress_stream(response.response, encoding, flush_each)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            compressed = self._compress_body(body, encoding)
+            self._count(encoding, len(body), len(compressed))
+            response.set_data(compressed)
+
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    # ============================================================
+    # Compression Strategies
+    # ============================================================
+    def _compress_body(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, mode=brotli.MODE_TEXT, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.level)
+
+    def _compress_stream(self, chunks, encoding, flush_each):
+        """Wraps a streamed body; counters are updated once the stream ends."""
+        compressor = _StreamCompressor(encoding, self.level, self.brotli_quality)
+        bytes_in = bytes_out = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                bytes_in += len(chunk)
+                out = compressor.compress(chunk, flush=flush_each)
+                if out:
+                    bytes_out += len(out)
+                    yield out
+            out = compressor.finish()
+            bytes_out += len(out)
+            yield out
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            self._count(encoding, bytes_in, bytes_out)
+
+    # ============================================================
+    # Counters
+    # ============================================================
+    def _count(self, encoding, bytes_in, bytes_out):
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.by_encoding[encoding] = self.by_encoding.get(encoding, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+                "by_encoding": dict(self.by_encoding),
+                "brotli_available": brotli is not None,
+            }
@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+# Ids of the 'processing' jobs this process runs (shared by all registries in it)
+_owned_jobs = set()
+_owned_lock = threading.Lock()
+
+
+def _pid_alive(pid):
+    """Whether a local process exists. Only checked on POSIX - os.kill(pid, 0) would terminate it on Windows."""
+    if os.name == "nt":
+        return True  # the heartbeat (stale_seconds) decides there
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ExportJobRegistry:
+    """
+    Export jobs kept in a local SQLite file instead of a module-level dict,
+    so they survive restarts and every worker process (gunicorn -w N) sees
+    the same jobs - /export_status works whichever worker serves it.
+
+    Each job is a JSON document (status, progress, SQL, row counts, file,
+    size, timings) plus a version that is bumped on every update. Finished
+    jobs are evicted together with their export file `ttl_seconds` after
+    their last update.
+
+    The process running a job refreshes its `updated_at` every few seconds.
+    A 'processing' job whose owner process is gone, or whose heartbeat is
+    older than `stale_seconds`, is marked 'error' (at startup and on read),
+    so status requests and streams don't wait on a job nobody is writing.
+
+    Subclasses keep other kinds of jobs in their own `table` of the file
+    (see InsightJobRegistry).
+    """
+
+    table = "export_jobs"
+    interrupted_error = "The export was interrupted (its worker process stopped)"
+
+    def __init__(self, path="export_jobs.sqlite3", ttl_seconds=86400, export_dir="exports",
+                 poll_interval=1.0, stale_seconds=120):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.export_dir = export_dir
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self._local = threading.local()  # one connection per thread
+        self._heartbeat_thread = None
+
+        # Updates made by this process wake up waiters at once; updates from
+        # other processes are picked up every poll_interval seconds
+        self._cond = threading.Condition()
+        self._changes = 0
+
+        # Counters (exposed through stats())
+        self.created = 0
+        self.evicted = 0
+        self.orphaned = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                " job_id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " version INTEGER NOT NULL,"
+                " data TEXT NOT NULL)"
+            )
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")}
+            if "owner_pid" not in columns:
+                conn.execute(f"ALTER TABLE {self.table} ADD COLUMN owner_pid INTEGER")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table}_updated ON {self.table} (updated_at)")
+        self.fail_orphaned()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ============================================================
+    # Create / Update / Read
+    # ============================================================
+    def create(self, **fields):
+        """Registers a new job (status 'processing' unless given) and returns its id."""
+        self.evict_expired()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        data = dict({"status": "processing"}, **fields)
+        processing = data["status"] == "processing"
+        if processing:
+            # Owned before the row exists, so a concurrent fail_orphaned() in
+            # this process never sees it as left over from a dead process
+            with _owned_lock:
+                _owned_jobs.add(job_id)
+        try:
+            self._connect().execute(
+                f"INSERT INTO {self.table} (job_id, status, created_at, updated_at, version, data, owner_pid)"
+                " VALUES (?, ?, ?, ?, 0, ?, ?)",
+                (job_id, data["status"], now, now, json.dumps(data, default=str), os.getpid()),
+            )
+        except BaseException:
+            with _owned_lock:
+                _owned_jobs.discard(job_id)
+            raise
+        with self._cond:
+            if processing:
+                self._start_heartbeat()
+            self.created += 1
+            self._changes += 1
+            self._cond.notify_all()
+        return job_id
+
+    def update(self, job_id, **fields):
+        """Merges `fields` into the job and bumps its version. Unknown ids are ignored."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(f"SELECT data FROM {self.table} WHERE job_id = ?", (job_id,)).fetchone()
+            data = None
+            if row is not None:
+                data = json.loads(row[0])
+                data.update(fields)
+                conn.execute(
+                    f"UPDATE {self.table} SET status = ?, updated_at = ?, version = version + 1, data = ? WHERE job_id = ?",
+                    (data["status"], time.time(), json.dumps(data, default=str), job_id),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._cond:
+            if data is None or data["status"] != "processing":
+                with _owned_lock:
+                    _owned_jobs.discard(job_id)
+            self._changes += 1
+            self._cond.notify_all()
+
+    def get(self, job_id, default=None):
+        """The job as a dict (with job_id, created_at, updated_at, version), or `default`."""
+        row = self._read(job_id)
+        if row is not None and row[4] == "processing" and self._is_orphaned(job_id, row[1], row[5]):
+            self._fail(job_id, row[2])
+            row = self._read(job_id)
+        if row is None or (row[4] != "processing" and self._is_expired(row[1])):
+            return default
+        created_at, updated_at, version, data, _, _ = row
+        return dict(json.loads(data), job_id=job_id, created_at=created_at, updated_at=updated_at, version=version)
+
+    def _read(self, job_id):
+        return self._connect().execute(
+            f"SELECT created_at, updated_at, version, data, status, owner_pid FROM {self.table} WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def wait_for_change(self, job_id, version, timeout):
+        """
+        Returns the job as soon as its version differs from `version` (or it
+        is gone: None). After `timeout` seconds returns it unchanged.
+        """
+        deadline = time.time() + timeout
+        while True:
+            with self._cond:
+                changes = self._changes
+            job = self.get(job_id)
+            if job is None or job["version"] != version:
+                return job
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return job
+            with self._cond:
+                self._cond.wait_for(lambda: self._changes != changes, timeout=min(self.poll_interval, remaining))
+
+    # ============================================================
+    # Heartbeat / Orphaned Jobs
+    # ============================================================
+    def _start_heartbeat(self):
+        """Starts the thread refreshing updated_at of this process's jobs. Caller holds the lock."""
+        if self._heartbeat_thread is not None and self._heartbeat_thread.is_alive():
+            return
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, name=f"{self.table}-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat(self):
+        interval = max(1.0, self.stale_seconds / 4)
+        while True:
+            time.sleep(interval)
+            with _owned_lock:
+                owned = list(_owned_jobs)
+            if not owned:
+                continue
+            try:
+                self._connect().executemany(
+                    f"UPDATE {self.table} SET updated_at = ? WHERE job_id = ? AND status = 'processing'",
+                    [(time.time(), job_id) for job_id in owned],
+                )
+            except sqlite3.Error as e:
+                print(f"⚠️ Job heartbeat failed ({self.table}): {repr(e)}")
+
+    def _is_orphaned(self, job_id, updated_at, owner_pid):
+        """True if nobody is writing this 'processing' job any more."""
+        if time.time() - updated_at > self.stale_seconds:
+            return True
+        if owner_pid == os.getpid():
+            with _owned_lock:
+                return job_id not in _owned_jobs  # left over from an earlier process with the same pid
+        return owner_pid is not None and not _pid_alive(owner_pid)
+
+    def _fail(self, job_id, version):
+        """Marks an orphaned job as failed (only if nobody updated it meanwhile)."""
+        conn = self._connect()
+        row = conn.execute(f"SELECT data FROM {self.table} WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        data = json.loads(row[0])
+        data.update(status="error", error=self.interrupted_error, finished_at=time.time())
+        cursor = conn.execute(
+            f"UPDATE {self.table} SET status = 'error', updated_at = ?, version = version + 1, data = ?"
+            " WHERE job_id = ? AND status = 'processing' AND version = ?",
+            (time.time(), json.dumps(data, default=str), job_id, version),
+        )
+        if cursor.rowcount:
+            with self._cond:
+                self.orphaned += 1
+                self._changes += 1
+                self._cond.notify_all()
+
+    def fail_orphaned(self):
+        """Marks every orphaned 'processing' job as failed. Returns how many there were."""
+        rows = self._connect().execute(
+            f"SELECT job_id, updated_at, version, owner_pid FROM {self.table} WHERE status = 'processing'"
+        ).fetchall()
+        orphaned = [(job_id, version) for job_id, updated_at, version, owner_pid in rows
+                    if self._is_orphaned(job_id, updated_at, owner_pid)]
+        for job_id, version in orphaned:
+            self._fail(job_id, version)
+        return len(orphaned)
+
+    # ============================================================
+    # TTL Eviction
+    # ============================================================
+    def _is_expired(self, updated_at):
+        return bool(self.ttl_seconds) and time.time() - updated_at > self.ttl_seconds
+
+    def evict_expired(self):
+        """
+        Deletes finished jobs last updated more than ttl_seconds ago, and
+        their export files. Running jobs are never evicted. Returns how many
+        were removed.
+        """
+        if not self.ttl_seconds:
+            return 0
+        self.fail_orphaned()
+        conn = self._connect()
+        cutoff = time.time() - self.ttl_seconds
+        rows = conn.execute(
+            f"SELECT job_id, data FROM {self.table} WHERE updated_at < ? AND status != 'processing'", (cutoff,)
+        ).fetchall()
+        if not rows:
+            return 0
+        conn.executemany(f"DELETE FROM {self.table} WHERE job_id = ?", [(job_id,) for job_id, _ in rows])
+        for _, data in rows:
+            filename = json.loads(data).get("file")
+            if filename:
+                try:
+                    os.remove(os.path.join(self.export_dir, filename))
+                except OSError:
+                    pass
+        with self._cond:
+            self.evicted += len(rows)
+        return len(rows)
+
+    def stats(self):
+        counts = dict(self._connect().execute(f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status").fetchall())
+        with self._cond:
+            return {
+                "jobs": sum(counts.values()),
+                "by_status": counts,
+                "created": self.created,
+                "evicted": self.evicted,
+                "orphaned": self.orphaned,
+                "ttl_seconds": self.ttl_seconds,
+                "path": self.path,
+            }
+
+
+class InsightJobRegistry(ExportJobRegistry):
+    """
+    Deferred insight jobs (status, streamed text chunks, final insights) in
+    the same kind of SQLite table, so /api/insights/<id> and the chat stream
+    find them whichever worker process generated them.
+    """
+
+    table = "insight_jobs"
+    interrupted_error = "The insight generation was interrupted (its worker process stopped)"
@@ -0,0 +1,251 @@
+import csv
+import datetime
+import gzip
+from decimal import Decimal
+
+import xlsxwriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional - only needed for the parquet export format
+    pa = pq = None
+
+
+# Excel's hard limit per worksheet (header row included)
+EXCEL_MAX_ROWS = 1_048_576
+
+# Written as text so Excel doesn't turn them into numbers (1.23E+07, dropped leading zeros)
+TEXT_COLUMNS = ('BE_Number', 'SB_Number', 'HS_Code')
+
+# format -> display name, file extension and the Content-Type /download serves it with
+EXPORT_FORMATS = {
+    'xlsx': {'label': 'Excel', 'extension': 'xlsx', 'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+    'csv': {'label': 'CSV', 'extension': 'csv', 'mimetype': 'text/csv'},
+    'csv.gz': {'label': 'gzip-compressed CSV', 'extension': 'csv.gz', 'mimetype': 'application/gzip'},
+    'parquet': {'label': 'Parquet', 'extension': 'parquet', 'mimetype': 'application/vnd.apache.parquet'},
+}
+
+_FORMAT_ALIASES = {'excel': 'xlsx', 'csv_gz': 'csv.gz', 'csvgz': 'csv.gz', 'gzip': 'csv.gz', 'pq': 'parquet'}
+
+
+def normalize_export_format(export_format, default='xlsx'):
+    """Canonical format name ('xlsx', 'csv', 'csv.gz', 'parquet'); raises ValueError if unknown or unavailable."""
+    name = str(export_format or default).strip().lower().lstrip('.')
+    name = _FORMAT_ALIASES.get(name, name)
+    if name not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if name == 'parquet' and pq is None:
+        raise ValueError("The parquet export format needs pyarrow (pip install pyarrow)")
+    return name
+
+
+def export_mimetype(filename):
+    """Content-Type for an export file, from its extension (longest match, so .csv.gz wins over .gz)."""
+    for spec in sorted(EXPORT_FORMATS.values(), key=lambda spec: -len(spec['extension'])):
+        if filename.endswith('.' + spec['extension']):
+            return spec['mimetype']
+    return None
+
+
+class _SheetWriter:
+    """Writes rows in order to 'Data', 'Data 2', ... (a new sheet every EXCEL_MAX_ROWS rows)."""
+
+    def __init__(self, workbook, columns, text_columns):
+        self.workbook = workbook
+        self.columns = columns
+        self.header_format = workbook.add_format({'bold': True, 'border': 1})
+        self.text_format = workbook.add_format({'num_format': '@'})
+        self.text_indexes = {i for i, name in enumerate(columns) if name in text_columns}
+        self.sheet_count = 0
+        self.worksheet = None
+        self.row = EXCEL_MAX_ROWS  # forces the first sheet
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        name = 'Data' if self.sheet_count == 1 else f'Data {self.sheet_count}'
+        self.worksheet = self.workbook.add_worksheet(name)
+        # constant_memory flushes each row once the next one starts, so column
+        # formats and the header have to be in place before any data
+        for i in self.text_indexes:
+            self.worksheet.set_column(i, i, None, self.text_format)
+        for i, name in enumerate(self.columns):
+            self.worksheet.write_string(0, i, name, self.header_format)
+        self.row = 1
+
+    def write_row(self, values):
+        if self.row >= EXCEL_MAX_ROWS:
+            self._new_sheet()
+        worksheet, row = self.worksheet, self.row
+        for col, value in enumerate(values):
+            if value is None:
+                continue
+            if col in self.text_indexes:
+                worksheet.write_string(row, col, str(value), self.text_format)
+            elif isinstance(value, bool):
+                worksheet.write_boolean(row, col, value)
+            elif isinstance(value, (int, float, Decimal)):
+                worksheet.write_number(row, col, float(value))
+            elif isinstance(value, (datetime.date, datetime.datetime)):
+                worksheet.write_string(row, col, value.isoformat())
+            else:
+                worksheet.write_string(row, col, str(value))
+        self.row += 1
+
+
+def write_xlsx(batches, file_path, text_columns=TEXT_COLUMNS):
+    """
+    Streams batches of row dicts (e.g. QueryAgent._iter_query_batches) into
+    an .xlsx file with xlsxwriter's constant_memory mode: each row is flushed
+    to disk as soon as it is complete, so memory stays at one batch however
+    many rows are exported. Returns the number of data rows written.
+    """
+    workbook = xlsxwriter.Workbook(file_path, {
+        'constant_memory': True,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+        'strings_to_numbers': False,
+    })
+    rows_written = 0
+    sheets = None
+    try:
+        for batch in batches:
+            if not batch:
+                continue
+            if sheets is None:
+                sheets = _SheetWriter(workbook, list(batch[0].keys()), text_columns)
+            for row in batch:
+                sheets.write_row(row.values())
+            rows_written += len(batch)
+
+        if sheets is None:
+            workbook.add_worksheet('Data')  # No rows: still a valid (empty) workbook
+    finally:
+        workbook.close()
+    return rows_written
+
+
+def write_csv(batches, file_path, compress=False):
+    """
+    Streams batches of row dicts into a CSV file (gzip-compressed when
+    compress=True). UTF-8 with a BOM so Excel opens it with the right
+    encoding. Returns the number of data rows written.
+    """
+    opener = gzip.open if compress else open
+    rows_written = 0
+    with opener(file_path, 'wt', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        header_written = False
+        for batch in batches:
+            if not batch:
+                continue
+            if not header_written:
+                writer.writerow(batch[0].keys())
+                header_written = True
+            writer.writerows(['' if v is None else v for v in row.values()] for row in batch)
+            rows_written += len(batch)
+    return rows_written
+
+
+# ============================================================
+# Parquet
+# ============================================================
+def _arrow_type(name, values):
+    """
+    Arrow type for a column, from the values of the first batch: dates stay
+    date32/timestamp, document numbers and codes are strings, all-null
+    columns become strings.
+    """
+    if name in TEXT_COLUMNS:
+        return pa.string()
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, bool) for v in present):
+        return pa.bool_()
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return pa.int64()
+    if present and all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in present):
+        return pa.float64()
+    if present and all(isinstance(v, datetime.datetime) for v in present):
+        return pa.timestamp('us')
+    if present and all(isinstance(v, datetime.date) and not isinstance(v, datetime.datetime) for v in present):
+        return pa.date32()
+    return pa.string()
+
+
+def _arrow_converter(arrow_type):
+    if arrow_type == pa.float64():
+        return lambda v: None if v is None else float(v)
+    if arrow_type == pa.int64():
+        return lambda v: None if v is None else int(v)
+    if arrow_type == pa.bool_():
+        return lambda v: None if v is None else bool(v)
+    if arrow_type == pa.date32():
+        return lambda v: v.date() if isinstance(v, datetime.datetime) else v
+    if arrow_type == pa.timestamp('us'):
+        return lambda v: v
+    return lambda v: None if v is None else (v.isoformat() if isinstance(v, (datetime.date, datetime.datetime)) else str(v))
+
+
+def write_parquet(batches, file_path, row_group_rows=100_000):
+    """
+    Streams batches of row dicts into a Parquet file with typed columns
+    (pass rows with date/datetime values, not display strings). Each fetch
+    batch is converted to an Arrow record batch right away; up to
+    `row_group_rows` rows are buffered in that columnar form and written as
+    one row group. The schema comes from the first batch (Decimal -> float64).
+    Returns the number of data rows written.
+    """
+    if pq is None:
+        raise RuntimeError("The parquet export format needs pyarrow (pip install pyarrow)")
+
+    writer = None
+    columns = schema = converters = None
+    pending = []   # Arrow record batches waiting for the next row group
+    pending_rows = 0
+    rows_written = 0
+
+    def flush(final=False):
+        """Writes full row groups (and the remainder if final); returns the rows still pending."""
+        table = pa.Table.from_batches(pending, schema=schema)
+        keep = 0 if final else table.num_rows % row_group_rows
+        writer.write_table(table.slice(0, table.num_rows - keep), row_group_size=row_group_rows)
+        pending[:] = table.slice(table.num_rows - keep).to_batches()  # zero-copy
+        return keep
+
+    try:
+        for batch in batches:
+            if not batch:
+                continue
+            if writer is None:
+                columns = list(batch[0].keys())
+                schema = pa.schema([(name, _arrow_type(name, [row[name] for row in batch])) for name in columns])
+                converters = [_arrow_converter(field.type) for field in schema]
+                writer = pq.ParquetWriter(file_path, schema, compression='snappy')
+            pending.append(pa.RecordBatch.from_arrays([
+                pa.array([convert(row[name]) for row in batch], type=field.type)
+                for name, field, convert in zip(columns, schema, converters)
+            ], schema=schema))
+            pending_rows += len(batch)
+            rows_written += len(batch)
+            if pending_rows >= row_group_rows:
+                pending_rows = flush()
+
+        if writer is None:
+            writer = pq.ParquetWriter(file_path, pa.schema([]))
+        elif pending_rows:
+            flush(final=True)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_written
+
+
+def write_export(batches, file_path, export_format='xlsx', row_group_rows=100_000):
+    """Writes the batches in the given export format. Returns the number of data rows written."""
+    if export_format == 'xlsx':
+        return write_xlsx(batches, file_path)
+    if export_format in ('csv', 'csv.gz'):
+        return write_csv(batches, file_path, compress=export_format == 'csv.gz')
+    if export_format == 'parquet':
+        return write_parquet(batches, file_path, row_group_rows=row_group_rows)
+    raise ValueError(f"Unknown export format '{export_format}'")
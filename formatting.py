@@ -0,0 +1,108 @@
+import datetime
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+
+# Columns holding BE/SB document numbers, shown as plain integers ("1234567", not "1234567.0")
+DOCUMENT_NUMBER_COLUMNS = ('BE_Number', 'SB_Number')
+
+_DATE_TYPES = (datetime.date, datetime.datetime)
+
+# Dates after format_date() ("05-Mar-2024") or ISO dates returned as text ("2024-03-05")
+_DISPLAY_DATE = re.compile(r'^(?:\d{2}-[A-Za-z]{3}-\d{4}|\d{4}-\d{2}-\d{2})$')
+
+
+@lru_cache(maxsize=16384)
+def format_date(value):
+    """DD-Mon-YYYY, memoized - result sets repeat the same few hundred dates."""
+    return value.strftime('%d-%b-%Y')
+
+
+def _format_document_number(value):
+    try:
+        return f"{float(value):.0f}"
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def _format_cell(col_name, value):
+    """Per-cell rule, used for columns that mix dates with other values."""
+    if isinstance(value, _DATE_TYPES):
+        return format_date(value)
+    if col_name in DOCUMENT_NUMBER_COLUMNS and value is not None:
+        return _format_document_number(value)
+    return value
+
+
+def format_column(col_name, values, format_dates=True):
+    """
+    Formats one column. The value types are checked once per column, so
+    plain text/number columns are passed through untouched and date columns
+    only pay for a (memoized) strftime per distinct date.
+    format_dates=False keeps date/datetime objects (typed exports).
+    """
+    value_types = set(map(type, values))
+    has_dates = format_dates and any(issubclass(t, _DATE_TYPES) for t in value_types)
+
+    if has_dates:
+        if value_types <= {datetime.date, datetime.datetime, type(None)}:
+            return [None if v is None else format_date(v) for v in values]
+        return [_format_cell(col_name, v) for v in values]
+
+    if col_name in DOCUMENT_NUMBER_COLUMNS:
+        return [None if v is None else _format_document_number(v) for v in values]
+
+    return list(values)
+
+
+def format_columns(rows, column_names, format_dates=True):
+    """Transposes DB rows and returns one formatted value list per column."""
+    if not rows:
+        return [[] for _ in column_names]
+    return [format_column(name, values, format_dates) for name, values in zip(column_names, zip(*rows))]
+
+
+def format_rows(rows, column_names, format_dates=True):
+    """
+    Converts DB rows to dicts for the frontend: dates as DD-Mon-YYYY and
+    BE/SB numbers as plain integer strings. Same output as formatting cell by
+    cell, but done column by column. format_dates=False leaves dates as
+    date/datetime objects (for typed exports such as Parquet).
+    """
+    columns = format_columns(rows, column_names, format_dates)
+    return [dict(zip(column_names, values)) for values in zip(*columns)]
+
+
+def infer_column_type(values):
+    """Column type for the frontend: "number", "date", "boolean" or "text"."""
+    present = [v for v in values if v is not None]
+    if not present:
+        return "text"
+    value_types = set(map(type, present))
+    if value_types <= {bool}:
+        return "boolean"
+    if value_types <= {int, float, Decimal}:
+        return "number"
+    if value_types <= {str} and all(_DISPLAY_DATE.match(v) for v in present[:50]):
+        return "date"
+    return "text"
+
+
+def to_columnar(rows):
+    """
+    Converts formatted row dicts to the compact response format
+    {"columns": [...], "rows": [[...], ...]} and returns it together with the
+    typed column metadata [{"name": ..., "type": ...}].
+    """
+    if not rows:
+        return {"columns": [], "rows": []}, []
+
+    # Every row dict comes from the same column list, so value order matches the keys
+    columns = list(rows[0].keys())
+    row_lists = [list(row.values()) for row in rows]
+    column_meta = [
+        {"name": name, "type": infer_column_type(values)}
+        for name, values in zip(columns, zip(*row_lists))
+    ]
+    return {"columns": columns, "rows": row_lists}, column_meta
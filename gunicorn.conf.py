@@ -0,0 +1,22 @@
+import os
+
+
+# gunicorn -c gunicorn.conf.py app:app
+#
+# Export and insight jobs are shared through SQLite, but the result sets
+# behind /api/results/<result_id> live in the memory (and spill directory)
+# of the worker that ran the query. Run one worker with threads, or several
+# behind a load balancer with sticky sessions (then set STICKY_SESSIONS=true).
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5005")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+
+def on_starting(server):
+    """Refuses a multi-worker start unless sticky sessions are promised."""
+    if server.cfg.workers > 1 and os.getenv("STICKY_SESSIONS", "false").lower() != "true":
+        raise RuntimeError(
+            f"{server.cfg.workers} workers requested, but result pages (/api/results) are kept "
+            "per worker. Use 1 worker with threads, or put the workers behind sticky sessions "
+            "and set STICKY_SESSIONS=true."
+        )
@@ -0,0 +1,295 @@
+import datetime
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from formatting import infer_column_type
+
+
+def _date_key(value):
+    """Sort key for display dates ("05-Mar-2024") and ISO dates ("2024-03-05")."""
+    for fmt in ('%d-%b-%Y', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, fmt).date().toordinal()
+        except (TypeError, ValueError):
+            continue
+    return 0
+
+
+class ResultStore:
+    """
+    Thread-safe, size-bounded store for full result sets, so /api/chat can
+    send the first page and /api/results/<result_id> serve the rest without
+    re-running the SQL.
+
+    Entries live in memory (LRU, bounded by estimated bytes); entries pushed
+    out of memory are pickled to `spill_dir` and loaded back on access. Disk
+    usage is bounded by `max_disk_bytes`, and every entry expires after
+    `ttl_seconds`.
+
+    Entries belong to the process that stored them: several workers need
+    sticky sessions (see gunicorn.conf.py).
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024, spill_dir="result_spill",
+                 max_disk_bytes=1024 * 1024 * 1024, ttl_seconds=3600):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self.current_bytes = 0
+        self.disk_bytes = 0
+        self._memory = OrderedDict()  # result_id -> entry dict
+        self._disk = OrderedDict()    # result_id -> (created_at, size, path)
+        self._spilling = {}           # result_id -> entry, while it is being written to disk
+        self._loading = {}            # result_id -> Event, set once it is back in memory
+        self._lock = threading.Lock()
+
+        # Counters (exposed through stats())
+        self.pages_served = 0
+        self.spills = 0
+        self.disk_loads = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def estimate_size(rows):
+        """Rough byte size of a result, extrapolated from a sample of rows."""
+        sample = rows[:100]
+        size = len(json.dumps(sample, default=str))
+        if sample:
+            size = int(size * len(rows) / len(sample))
+        return size
+
+    # ============================================================
+    # Store / Fetch
+    # ============================================================
+    def put(self, rows):
+        """Stores the formatted row dicts and returns their result_id."""
+        result_id = uuid.uuid4().hex
+        entry = {"rows": rows, "created_at": time.time(), "size": self.estimate_size(rows), "sorted": None}
+        with self._lock:
+            self._expire()
+            self._memory[result_id] = entry
+            self.current_bytes += entry["size"]
+            victims = self._take_over_budget(keep=result_id)
+        self._spill(victims)
+        return result_id
+
+    def _get_entry(self, result_id):
+        """Returns the in-memory entry, loading it back from disk if it was spilled."""
+        while True:
+            with self._lock:
+                entry = self._memory.get(result_id)
+                if entry is not None:
+                    if self._is_expired(entry["created_at"]):
+                        self._memory.pop(result_id)
+                        self.current_bytes -= entry["size"]
+                        self.expirations += 1
+                        return None
+                    self._memory.move_to_end(result_id)
+                    return entry
+
+                if result_id in self._spilling:
+                    return self._spilling[result_id]
+
+                loading = self._loading.get(result_id)
+                if loading is None:
+                    spilled = self._disk.pop(result_id, None)
+                    if spilled is None:
+                        return None
+                    created_at, size, path = spilled
+                    self.disk_bytes -= size
+                    loaded = self._loading[result_id] = threading.Event()
+                    break
+
+            # Another request is reading it from disk - wait, then look again
+            loading.wait()
+
+        try:
+            return self._load_spilled(result_id, created_at, path)
+        finally:
+            with self._lock:
+                self._loading.pop(result_id, None)
+            loaded.set()
+
+    def _load_spilled(self, result_id, created_at, path):
+        """Reads a spilled entry back into memory (outside the lock - other requests shouldn't wait on the disk)."""
+        try:
+            with open(path, "rb") as f:
+                rows = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"⚠️ Could not read spilled result {result_id}: {repr(e)}")
+            return None
+        finally:
+            self._remove_file(path)
+
+        if self._is_expired(created_at):
+            with self._lock:
+                self.expirations += 1
+            return None
+
+        entry = {"rows": rows, "created_at": created_at, "size": self.estimate_size(rows), "sorted": None}
+        with self._lock:
+            self.disk_loads += 1
+            self._memory[result_id] = entry
+            self.current_bytes += entry["size"]
+            victims = self._take_over_budget(keep=result_id)
+        self._spill(victims)
+        return entry
+
+    def get_page(self, result_id, offset=0, limit=200, sort=None):
+        """
+        Returns {"total_rows", "offset", "limit", "sort", "rows"} for one page,
+        or None if the result is unknown or expired. `sort` is a column name,
+        prefixed with "-" for descending order. Raises ValueError for an
+        unknown sort column.
+        """
+        entry = self._get_entry(result_id)
+        if entry is None:
+            return None
+
+        rows = entry["rows"]
+        if sort:
+            rows = self._sorted_rows(entry, sort)
+
+        offset = max(0, offset)
+        limit = max(0, limit)
+        with self._lock:
+            self.pages_served += 1
+        return {
+            "total_rows": len(entry["rows"]),
+            "offset": offset,
+            "limit": limit,
+            "sort": sort or None,
+            "rows": rows[offset:offset + limit],
+        }
+
+    def _sorted_rows(self, entry, sort):
+        """
+        Sorts by one column (None last); the last sort order is kept on the
+        entry. The cache is read and replaced under the lock, the sort itself
+        runs outside it (two concurrent sorts just both compute it).
+        """
+        with self._lock:
+            cached = entry["sorted"]
+        if cached is not None and cached[0] == sort:
+            return cached[1]
+
+        descending = sort.startswith("-")
+        column = sort.lstrip("-")
+        rows = entry["rows"]
+        if rows and column not in rows[0]:
+            raise ValueError(f"Unknown sort column: {column}")
+
+        column_type = infer_column_type([row[column] for row in rows[:200]]) if rows else "text"
+        if column_type == "date":
+            value_key = _date_key
+        elif column_type == "number":
+            value_key = float
+        else:
+            value_key = lambda v: str(v).lower()
+
+        present = [row for row in rows if row[column] is not None]
+        missing = [row for row in rows if row[column] is None]
+        try:
+            present.sort(key=lambda row: value_key(row[column]), reverse=descending)
+        except (TypeError, ValueError):
+            present.sort(key=lambda row: str(row[column]).lower(), reverse=descending)
+
+        ordered = present + missing
+        with self._lock:
+            entry["sorted"] = (sort, ordered)
+        return ordered
+
+    # ============================================================
+    # Memory / Disk Budget
+    # ============================================================
+    def _is_expired(self, created_at):
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def _expire(self):
+        """Drops expired entries from memory and disk. Caller holds the lock."""
+        for result_id in [rid for rid, entry in self._memory.items() if self._is_expired(entry["created_at"])]:
+            entry = self._memory.pop(result_id)
+            self.current_bytes -= entry["size"]
+            self.expirations += 1
+        for result_id in [rid for rid, (created_at, _, _) in self._disk.items() if self._is_expired(created_at)]:
+            _, size, path = self._disk.pop(result_id)
+            self.disk_bytes -= size
+            self.expirations += 1
+            self._remove_file(path)
+
+    def _take_over_budget(self, keep):
+        """
+        Removes least recently used entries (never `keep`) until memory fits
+        and returns them for spilling. Caller holds the lock.
+        """
+        victims = []
+        while self.current_bytes > self.max_bytes:
+            result_id = next((rid for rid in self._memory if rid != keep), None)
+            if result_id is None:
+                break
+            entry = self._memory.pop(result_id)
+            self.current_bytes -= entry["size"]
+            self._spilling[result_id] = entry
+            victims.append((result_id, entry))
+        return victims
+
+    def _spill(self, victims):
+        """Pickles evicted entries to disk (outside the lock), then drops the oldest files over max_disk_bytes."""
+        for result_id, entry in victims:
+            path = os.path.join(self.spill_dir, f"{result_id}.pkl")
+            size = None
+            if self.max_disk_bytes > 0:
+                try:
+                    os.makedirs(self.spill_dir, exist_ok=True)
+                    with open(path, "wb") as f:
+                        pickle.dump(entry["rows"], f, protocol=pickle.HIGHEST_PROTOCOL)
+                    size = os.path.getsize(path)
+                except OSError as e:
+                    print(f"⚠️ Could not spill result {result_id} to disk: {repr(e)}")
+
+            stale_paths = []
+            with self._lock:
+                self._spilling.pop(result_id, None)
+                if size is None:
+                    self.evictions += 1
+                    continue
+                self._disk[result_id] = (entry["created_at"], size, path)
+                self.disk_bytes += size
+                self.spills += 1
+                while self.disk_bytes > self.max_disk_bytes and self._disk:
+                    _, (_, old_size, old_path) = self._disk.popitem(last=False)
+                    self.disk_bytes -= old_size
+                    self.evictions += 1
+                    stale_paths.append(old_path)
+            for old_path in stale_paths:
+                self._remove_file(old_path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries_in_memory": len(self._memory),
+                "entries_on_disk": len(self._disk),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self.disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "pages_served": self.pages_served,
+                "spills": self.spills,
+                "disk_loads": self.disk_loads,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
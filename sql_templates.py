@@ -0,0 +1,316 @@
+import re
+import threading
+from collections import OrderedDict
+
+
+# Words that mean a captured product slot is really a different question shape
+# (comparisons, extra filters, generic categories) and must not be filled in.
+AMBIGUOUS_SLOT_WORDS = {
+    'vs', 'versus', 'compare', 'and', 'or', 'between', 'not', 'except', 'excluding',
+    'all', 'product', 'products', 'of', 'by', 'in', 'for', 'from', 'since', 'to',
+    'top', 'total', 'import', 'imports', 'export', 'exports', 'importers', 'exporters',
+}
+
+# Columns whose LIKE values are stored UPPERCASE-NO-SPACES (see QueryAgent._fix_product_column_in_sql)
+SPACE_NORMALIZED_COLUMNS = {'product', 'product_name'}
+
+# Literals in generated SQL that can become parameter slots
+_SQL_SLOT_PATTERN = re.compile(
+    r"(?P<like>(?P<like_column>\[[^\]]+\]|[\w.]+)\s+LIKE\s+'%(?P<like_value>[^'%]+)%')"
+    r"|(?P<top>\bTOP\s+(?P<top_value>\d+)\b)"
+    r"|(?P<year>DATEFROMPARTS\(\s*(?P<year_value>\d{4})\s*,)"
+    r"|(?P<date>'(?P<date_year>\d{4})(?P<date_rest>-\d{2}-\d{2})')",
+    re.IGNORECASE,
+)
+
+
+def normalize_question(text):
+    """Lowercases, drops punctuation and collapses whitespace."""
+    text = re.sub(r"[?.!,;:\"']+", ' ', str(text or '').lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class SqlTemplate:
+    """
+    A validated SQL statement turned into a skeleton with parameter slots,
+    plus the question shape it answers.
+    """
+
+    def __init__(self, question_skeleton, question_regex, segments, llm_data, originals):
+        self.question_skeleton = question_skeleton
+        self.question_regex = question_regex
+        self.segments = segments      # str pieces and slot dicts, in SQL order
+        self.llm_data = llm_data      # answer/query_type/is_time_series/chart_title
+        self.originals = originals    # slot name -> value seen when learning
+        self.hits = 0
+
+    def render(self, slots):
+        """Fills the slots and returns the SQL for the new question."""
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+
+            kind, slot = segment["kind"], segment["slot"]
+            if kind == "like":
+                value = slots[slot].upper()
+                if segment["space_normalized"]:
+                    value = value.replace(' ', '')
+                parts.append(f"{segment['column']} LIKE '%{value}%'")
+            elif kind == "top":
+                parts.append(f"TOP {int(slots[slot])}")
+            elif kind == "year":
+                parts.append(f"DATEFROMPARTS({int(slots[slot]) + segment['offset']},")
+            elif kind == "date":
+                parts.append(f"'{int(slots[slot]) + segment['offset']}{segment['rest']}'")
+        return ''.join(parts)
+
+    def render_text(self, text, slots):
+        """Rewrites the answer/chart title so it mentions the new slot values."""
+        if not text:
+            return text
+        for slot, original in self.originals.items():
+            new_value = str(slots[slot])
+
+            def match_case(m):
+                found = m.group(0)
+                if found.isupper():
+                    return new_value.upper()
+                if found.istitle():
+                    return new_value.title()
+                return new_value
+
+            text = re.sub(r'\b' + re.escape(str(original)) + r'\b', match_case, text, flags=re.IGNORECASE)
+        return text
+
+
+class SqlTemplateStore:
+    """
+    Learns parameterized SQL templates from validated LLM output.
+
+    Each successfully executed `sql_query` is turned into a skeleton whose
+    product LIKE patterns, years/dates and TOP N are slots tied to words in
+    the question. A new question with the same shape is answered by filling
+    the slots locally (no LLM call). The agent sends the result with its
+    literals bound as parameters, so SQL Server reuses the cached plan too.
+    """
+
+    def __init__(self, max_templates=256):
+        self.max_templates = max_templates
+        self._templates = OrderedDict()  # question skeleton -> SqlTemplate
+        self._lock = threading.Lock()
+
+        # Counters (exposed through stats())
+        self.learned = 0
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------
+    # Learning
+    # ------------------------------------------------------------
+    def learn(self, user_query, llm_data, sql_query, history=None):
+        """
+        Stores a template for (question, fixed SQL) if every product, TOP and
+        year/date literal in the SQL can be traced back to the question.
+        Follow-up questions (non-empty `history`) are never learned - their SQL
+        carries literals from earlier turns. Returns the template or None.
+        """
+        if self.max_templates <= 0 or not sql_query or history:
+            return None
+
+        question = normalize_question(user_query)
+        tokens = question.split()
+        slot_tokens = {}   # token index -> slot name (in the question)
+        originals = {}     # slot name -> original value
+        segments = []
+        position = 0
+        product_slots = {}  # normalized LIKE value -> slot name
+
+        for match in _SQL_SLOT_PATTERN.finditer(sql_query):
+            segment = None
+
+            if match.group("like"):
+                value = match.group("like_value")
+                slot = product_slots.get(value.upper())
+                if slot is None:
+                    span = self._find_phrase(tokens, value, slot_tokens)
+                    if span is None:
+                        return None  # Literal came from somewhere else (history, LLM guess)
+                    slot = "product" if not product_slots else f"product{len(product_slots)}"
+                    product_slots[value.upper()] = slot
+                    for i in range(*span):
+                        slot_tokens[i] = slot if i == span[0] else None
+                    originals[slot] = ' '.join(tokens[span[0]:span[1]])
+                column = match.group("like_column")
+                # Only Product values are stored without spaces; company names keep them
+                segment = {
+                    "kind": "like",
+                    "slot": slot,
+                    "column": column,
+                    "space_normalized": column.split('.')[-1].strip('[]').lower() in SPACE_NORMALIZED_COLUMNS,
+                }
+
+            elif match.group("top"):
+                value = match.group("top_value")
+                index = self._find_token(tokens, value, slot_tokens, "top_n")
+                if index is None:
+                    return None  # A TOP the question never asked for would stay hard-coded
+                slot_tokens[index] = "top_n"
+                originals["top_n"] = value
+                segment = {"kind": "top", "slot": "top_n"}
+
+            else:
+                value = int(match.group("year_value") or match.group("date_year"))
+                year_index = self._find_year(tokens, value, slot_tokens)
+                if year_index is None:
+                    return None  # Same for a year/date that is not in the question
+                slot_tokens[year_index] = "year"
+                originals["year"] = tokens[year_index]
+                offset = value - int(tokens[year_index])
+                if match.group("year"):
+                    segment = {"kind": "year", "slot": "year", "offset": offset}
+                else:
+                    segment = {"kind": "date", "slot": "year", "offset": offset, "rest": match.group("date_rest")}
+
+            segments.append(sql_query[position:match.start()])
+            segments.append(segment)
+            position = match.end()
+
+        if not originals:
+            return None  # Nothing to parameterize - exact repeats are the translation cache's job
+        segments.append(sql_query[position:])
+
+        # Build the question skeleton (slots replace the words they came from)
+        skeleton_parts = []
+        regex_parts = []
+        for i, token in enumerate(tokens):
+            if i in slot_tokens:
+                slot = slot_tokens[i]
+                if slot is None:
+                    continue  # Later words of a multi-word product
+                skeleton_parts.append("{" + slot + "}")
+                if slot.startswith("product"):
+                    regex_parts.append(f"(?P<{slot}>[a-z][a-z0-9\\- ]{{0,40}}?)")
+                elif slot == "year":
+                    regex_parts.append(r"(?P<year>\d{4})")
+                else:
+                    regex_parts.append(r"(?P<top_n>\d{1,3})")
+            else:
+                skeleton_parts.append(token)
+                regex_parts.append(re.escape(token))
+
+        question_skeleton = ' '.join(skeleton_parts)
+        template = SqlTemplate(
+            question_skeleton=question_skeleton,
+            question_regex=re.compile(' '.join(regex_parts)),
+            segments=segments,
+            llm_data={k: llm_data.get(k) for k in ("answer", "query_type", "is_time_series", "chart_title")},
+            originals=originals,
+        )
+
+        with self._lock:
+            is_new = question_skeleton not in self._templates
+            self._templates[question_skeleton] = template
+            self._templates.move_to_end(question_skeleton)
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+            if is_new:
+                self.learned += 1
+        return template
+
+    @staticmethod
+    def _find_phrase(tokens, like_value, taken):
+        """Finds the 1-4 word phrase whose space-less uppercase form equals the LIKE value."""
+        target = like_value.replace(' ', '').upper()
+        for length in range(1, 5):
+            for start in range(0, len(tokens) - length + 1):
+                if any(i in taken for i in range(start, start + length)):
+                    continue
+                if ''.join(tokens[start:start + length]).upper() == target:
+                    return start, start + length
+        return None
+
+    @staticmethod
+    def _find_token(tokens, value, taken, slot):
+        for i, token in enumerate(tokens):
+            if token == value and (i not in taken or taken[i] == slot):
+                return i
+        return None
+
+    @staticmethod
+    def _find_year(tokens, year, taken):
+        """The question year this SQL year derives from (e.g. 2025 for "in 2024" is year + 1)."""
+        candidates = [i for i, token in enumerate(tokens)
+                      if re.fullmatch(r'(19|20)\d{2}', token) and (i not in taken or taken[i] == "year")]
+        for i in candidates:
+            if int(tokens[i]) == year:
+                return i
+        for i in candidates:
+            if abs(int(tokens[i]) - year) <= 1:
+                return i
+        return None
+
+    # ------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------
+    def match(self, user_query, history=None):
+        """
+        Returns the llm_data (sql_query, answer, chart_title, ...) of the first
+        stored template the question fits, or None. Follow-up questions (non-empty
+        `history`) are left to the LLM, which sees the earlier turns.
+        """
+        if history:
+            return None
+        question = normalize_question(user_query)
+        with self._lock:
+            templates = list(reversed(self._templates.values()))  # Most recent first
+
+        for template in templates:
+            m = template.question_regex.fullmatch(question)
+            if not m:
+                continue
+            slots = m.groupdict()
+            if not self._slots_are_safe(slots):
+                continue
+
+            llm_data = dict(template.llm_data)
+            llm_data["sql_query"] = template.render(slots)
+            llm_data["answer"] = template.render_text(llm_data.get("answer"), slots)
+            llm_data["chart_title"] = template.render_text(llm_data.get("chart_title"), slots)
+
+            with self._lock:
+                template.hits += 1
+                self.hits += 1
+                if template.question_skeleton in self._templates:
+                    self._templates.move_to_end(template.question_skeleton)
+            return llm_data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _slots_are_safe(slots):
+        for slot, value in slots.items():
+            if slot.startswith("product"):
+                words = value.split()
+                if not words or len(words) > 4 or any(w in AMBIGUOUS_SLOT_WORDS for w in words):
+                    return False
+            elif slot == "top_n" and not 1 <= int(value) <= 500:
+                return False
+            elif slot == "year" and not 1990 <= int(value) <= 2099:
+                return False
+        return True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "templates": len(self._templates),
+                "max_templates": self.max_templates,
+                "learned": self.learned,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
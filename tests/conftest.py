@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import create_engine
+
+
+class _NoLLM:
+    """Stands in for the Gemini model; these tests never reach the LLM."""
+
+    def generate_content(self, *args, **kwargs):
+        raise AssertionError("unexpected LLM call")
+
+
+@pytest.fixture
+def query_agent(tmp_path, monkeypatch):
+    """A QueryAgent on an empty SQLite database, with its state files in tmp_path."""
+    monkeypatch.setenv("EXPORT_JOBS_DB", str(tmp_path / "export_jobs.sqlite3"))
+    monkeypatch.setenv("INSIGHT_JOBS_DB", str(tmp_path / "insight_jobs.sqlite3"))
+    monkeypatch.setenv("RESULT_STORE_SPILL_DIR", str(tmp_path / "result_spill"))
+
+    from agent import QueryAgent
+    return QueryAgent(model=_NoLLM(), engine=create_engine("sqlite://"))
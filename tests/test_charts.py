@@ -0,0 +1,124 @@
+import datetime
+import math
+
+from charts import build_category_chart, build_time_series_chart, lttb_indices
+
+
+def _daily_rows(days, start=datetime.date(2024, 1, 1)):
+    return [{"BE_Date": start + datetime.timedelta(days=i), "Total_Value_INR": 100.0, "Unit_Price": float(i % 2)}
+            for i in range(days)]
+
+
+def test_rows_broken_down_by_company_are_not_summed():
+    rows = []
+    for day in range(3):
+        for company in ("ACME METALS", "ZENITH ALLOYS"):
+            rows.append({"BE_Date": datetime.date(2024, 1, 1 + day), "Importer/Exporter_Name": company,
+                         "Total_Value_INR": 100.0})
+    assert build_time_series_chart(rows) is None
+
+
+def test_single_valued_label_column_is_still_charted():
+    rows = [{"Month": f"{m:02d}-Jan-2024", "Product": "ZINC", "Total_Value_INR": 10.0 * m} for m in range(1, 4)]
+    chart = build_time_series_chart(rows)
+    assert chart["label_column"] == "Month"
+    assert chart["series"] == [{"name": "Total_Value_INR", "values": [10.0, 20.0, 30.0]}]
+
+
+def test_short_span_stays_daily():
+    chart = build_time_series_chart(_daily_rows(30), max_points=500)
+    assert chart["granularity"] == "daily"
+    assert chart["points"] == 30 and not chart["downsampled"]
+    assert chart["labels"][0] == "01-Jan-2024"
+
+
+def test_long_span_is_bucketed_weekly_with_sums_and_averages():
+    chart = build_time_series_chart(_daily_rows(140), max_points=50)  # 140 days -> 20 weeks
+    assert chart["granularity"] == "weekly"
+    assert chart["source_points"] == 140 and chart["points"] == 20  # 2024-01-01 is a Monday
+    values = {s["name"]: s["values"] for s in chart["series"]}
+    assert values["Total_Value_INR"][0] == 700.0       # summed
+    assert values["Unit_Price"][0] == 3 / 7            # averaged
+
+
+def test_multi_year_span_is_bucketed_monthly():
+    chart = build_time_series_chart(_daily_rows(3 * 365), max_points=100)
+    assert chart["granularity"] == "monthly"
+    assert chart["labels"][:2] == ["Jan-2024", "Feb-2024"]
+    assert chart["series"][0]["values"][0] == 3100.0
+
+
+def test_month_rows_keep_their_granularity():
+    rows = [{"Month": datetime.date(2024, m, 1), "Total_Value_INR": 1.0} for m in range(1, 13)]
+    chart = build_time_series_chart(rows, max_points=500)
+    assert chart["granularity"] == "monthly" and chart["points"] == 12
+
+
+def test_too_many_buckets_are_downsampled_with_lttb():
+    chart = build_time_series_chart(_daily_rows(400), max_points=450)
+    assert not chart["downsampled"]
+    chart = build_time_series_chart(_daily_rows(20 * 365), max_points=60)  # 240 months
+    assert chart["downsampled"] and chart["points"] == 60
+    assert chart["labels"][0] == "Jan-2024"
+
+
+def test_lttb_keeps_ends_and_the_peak():
+    xs = list(range(1000))
+    ys = [math.sin(x / 50) for x in xs]
+    ys[500] = 10.0
+    indices = lttb_indices(xs, ys, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert indices == sorted(set(indices))
+    assert 500 in indices
+
+
+def test_lttb_below_threshold_keeps_everything():
+    assert lttb_indices([1, 2, 3], [1, 2, 3], 10) == [0, 1, 2]
+
+
+def _company_rows(count):
+    # Company 0 has the largest value, company count-1 the smallest
+    return [{"Importer/Exporter_Name": f"COMPANY {i}", "Total_Value_INR": 1000.0 * (count - i),
+             "Quantity_KG": 10.0 * (i + 1), "Avg_Unit_Price": 5.0} for i in range(count)]
+
+
+def test_top_k_labels_plus_others():
+    chart = build_category_chart(_company_rows(20), top_k=5)
+    assert chart["labels"] == ["COMPANY 0", "COMPANY 1", "COMPANY 2", "COMPANY 3", "COMPANY 4", "Others"]
+    assert chart["others_count"] == 15 and chart["points"] == 6
+    values = {s["name"]: s["values"] for s in chart["series"]}
+    assert values["Total_Value_INR"][:2] == [20000.0, 19000.0]
+    assert values["Total_Value_INR"][-1] == sum(1000.0 * (20 - i) for i in range(5, 20))
+    assert values["Quantity_KG"][-1] == sum(10.0 * (i + 1) for i in range(5, 20))
+
+
+def test_others_price_is_the_weighted_value_quantity_ratio():
+    chart = build_category_chart(_company_rows(20), top_k=5)
+    values = {s["name"]: s["values"] for s in chart["series"]}
+    value_sum = sum(1000.0 * (20 - i) for i in range(5, 20))
+    quantity_sum = sum(10.0 * (i + 1) for i in range(5, 20))
+    assert values["Avg_Unit_Price"][:5] == [5.0] * 5
+    assert values["Avg_Unit_Price"][-1] == value_sum / quantity_sum  # not the mean of the averages
+
+
+def test_others_price_without_a_quantity_column_is_unknown():
+    rows = [{k: v for k, v in row.items() if k != "Quantity_KG"} for row in _company_rows(20)]
+    values = {s["name"]: s["values"] for s in build_category_chart(rows, top_k=5)["series"]}
+    assert values["Avg_Unit_Price"][-1] is None
+
+
+def test_a_single_label_is_not_folded_into_others():
+    chart = build_category_chart(_company_rows(6), top_k=5)
+    assert chart["labels"] == [f"COMPANY {i}" for i in range(6)]
+    assert chart["others_count"] == 0
+
+    chart = build_category_chart(_company_rows(7), top_k=5)
+    assert chart["labels"][-1] == "Others" and chart["others_count"] == 2
+
+
+def test_duplicate_labels_are_merged():
+    rows = _company_rows(3) + _company_rows(3)
+    chart = build_category_chart(rows, top_k=5)
+    assert chart["labels"] == ["COMPANY 0", "COMPANY 1", "COMPANY 2"]
+    assert chart["series"][0]["values"] == [6000.0, 4000.0, 2000.0]
@@ -0,0 +1,46 @@
+import gzip
+
+from flask import Flask, Response
+
+from compression import ResponseCompressor
+
+
+def _client():
+    app = Flask(__name__)
+    compressor = ResponseCompressor(app, min_size=1024)
+
+    @app.route("/big")
+    def big():
+        return {"rows": [{"Product": "ZINC OXIDE", "Value": i} for i in range(20000)]}
+
+    @app.route("/small")
+    def small():
+        return {"ok": True}
+
+    @app.route("/stream")
+    def stream():
+        return Response((f"data: {i}\n\n" for i in range(3)), mimetype="text/event-stream")
+
+    return app.test_client(), compressor
+
+
+def test_large_body_is_compressed_inline():
+    client, compressor = _client()
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) == len(response.data)
+    assert b'"Value":19999' in gzip.decompress(response.data).replace(b" ", b"")
+    assert compressor.stats()["responses"] == 1
+
+
+def test_small_body_and_unsupported_client_are_left_alone():
+    client, _ = _client()
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_event_stream_is_compressed_on_the_fly():
+    client, _ = _client()
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == b"data: 0\n\ndata: 1\n\ndata: 2\n\n"
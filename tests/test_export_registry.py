@@ -0,0 +1,141 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import export_registry
+from export_registry import ExportJobRegistry, InsightJobRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ExportJobRegistry(path=str(tmp_path / "jobs.sqlite3"), export_dir=str(tmp_path), stale_seconds=120)
+
+
+def _insert(registry, job_id, owner_pid, updated_at=None):
+    now = time.time()
+    registry._connect().execute(
+        "INSERT INTO export_jobs (job_id, status, created_at, updated_at, version, data, owner_pid)"
+        " VALUES (?, 'processing', ?, ?, 0, '{\"status\": \"processing\"}', ?)",
+        (job_id, now, updated_at or now, owner_pid),
+    )
+
+
+def test_update_bumps_version_and_wakes_waiters(registry):
+    job_id = registry.create(progress=0)
+    assert registry.get(job_id)["version"] == 0
+
+    threading.Timer(0.1, registry.update, (job_id,), {"progress": 50}).start()
+    job = registry.wait_for_change(job_id, 0, timeout=5)
+    assert job["version"] == 1 and job["progress"] == 50
+
+    started = time.time()
+    assert registry.wait_for_change(job_id, 1, timeout=0.2)["version"] == 1
+    assert time.time() - started >= 0.2
+    registry.update(job_id, status="done")
+
+
+def test_job_of_a_dead_process_is_failed(registry):
+    if os.name == "nt":
+        pytest.skip("owner pids are not checked on Windows")
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    _insert(registry, "dead-owner", child.pid)
+
+    job = registry.get("dead-owner")
+    assert job["status"] == "error"
+    assert registry.stats()["orphaned"] == 1
+
+
+def test_job_left_over_from_an_earlier_process_with_our_pid_is_failed(registry):
+    _insert(registry, "same-pid", os.getpid())
+    assert registry.fail_orphaned() == 1
+    assert registry.get("same-pid")["status"] == "error"
+
+
+def test_job_with_a_stale_heartbeat_is_failed(registry):
+    job_id = registry.create()
+    registry._connect().execute("UPDATE export_jobs SET updated_at = ? WHERE job_id = ?", (time.time() - 600, job_id))
+    assert registry.get(job_id)["status"] == "error"
+
+
+def test_heartbeat_keeps_running_jobs_fresh(tmp_path):
+    registry = ExportJobRegistry(path=str(tmp_path / "jobs.sqlite3"), stale_seconds=4)  # beats every second
+    job_id = registry.create()
+    stale = time.time() - 3
+    registry._connect().execute("UPDATE export_jobs SET updated_at = ? WHERE job_id = ?", (stale, job_id))
+
+    time.sleep(1.5)
+    job = registry.get(job_id)
+    assert job["status"] == "processing"
+    assert job["updated_at"] > stale + 2
+    registry.update(job_id, status="done")
+
+
+def test_create_is_never_seen_as_orphaned(registry, tmp_path, monkeypatch):
+    # Another registry in the same process sweeps for orphans right after the INSERT
+    other = ExportJobRegistry(path=registry.path, export_dir=str(tmp_path))
+    connect = registry._connect
+
+    class SweepAfterInsert:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def execute(self, sql, *args):
+            result = self.conn.execute(sql, *args)
+            if sql.startswith("INSERT"):
+                other.fail_orphaned()
+            return result
+
+    monkeypatch.setattr(registry, "_connect", lambda: SweepAfterInsert(connect()))
+    job_id = registry.create()
+    monkeypatch.undo()
+
+    assert registry.get(job_id)["status"] == "processing"
+    assert other.stats()["orphaned"] == 0
+    registry.update(job_id, status="done")
+
+
+def test_failed_insert_releases_ownership(registry, monkeypatch):
+    class FailingConnection:
+        def execute(self, sql, *args):
+            raise export_registry.sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(registry, "evict_expired", lambda: 0)
+    monkeypatch.setattr(registry, "_connect", FailingConnection)
+    owned = set(export_registry._owned_jobs)
+    with pytest.raises(export_registry.sqlite3.OperationalError):
+        registry.create()
+    assert export_registry._owned_jobs == owned
+
+
+def test_eviction_skips_running_jobs(registry):
+    running = registry.create()
+    finished = registry.create()
+    registry.update(finished, status="done")
+    old = time.time() - registry.ttl_seconds - 60
+    registry._connect().execute("UPDATE export_jobs SET updated_at = ?", (old,))
+    registry._connect().execute("UPDATE export_jobs SET updated_at = ? WHERE job_id = ?", (time.time(), running))
+
+    assert registry.evict_expired() == 1
+    assert registry.get(finished) is None
+    assert registry.get(running)["status"] == "processing"
+    registry.update(running, status="done")
+
+
+def test_insight_jobs_are_seen_by_another_worker(tmp_path):
+    path = str(tmp_path / "insights.sqlite3")
+    writer = InsightJobRegistry(path=path, poll_interval=0.05)
+    reader = InsightJobRegistry(path=path, poll_interval=0.05)  # stands in for another process
+    insight_id = writer.create(insights=None, chunks=[])
+
+    threading.Timer(0.1, writer.update, (insight_id,), {"chunks": ["Zinc imports rose."]}).start()
+    job = reader.wait_for_change(insight_id, 0, timeout=5)
+    assert job["chunks"] == ["Zinc imports rose."]
+
+    writer.update(insight_id, status="ready", insights="Zinc imports rose.")
+    assert reader.get(insight_id)["status"] == "ready"
+    assert reader.stats()["jobs"] == 1
@@ -0,0 +1,156 @@
+import csv
+import datetime
+import gzip
+import io
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from decimal import Decimal
+
+import pytest
+
+import exporter
+from exporter import export_mimetype, normalize_export_format, write_csv, write_export, write_parquet, write_xlsx
+
+
+_NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def _read_xlsx(path):
+    """{sheet name: rows of cell values} - inline strings as str, numbers as float (openpyxl-free)."""
+    with zipfile.ZipFile(path) as workbook:
+        names = [sheet.get("name") for sheet in ET.fromstring(workbook.read("xl/workbook.xml")).iter(f"{{{_NS['m']}}}sheet")]
+        sheets = {}
+        for index, name in enumerate(names, start=1):
+            rows = []
+            for row in ET.fromstring(workbook.read(f"xl/worksheets/sheet{index}.xml")).iter(f"{{{_NS['m']}}}row"):
+                values = {}
+                for cell in row.findall("m:c", _NS):
+                    column = ord(re.match(r"[A-Z]", cell.get("r")).group()) - ord("A")
+                    if cell.get("t") == "inlineStr":
+                        values[column] = cell.find("m:is/m:t", _NS).text
+                    else:
+                        values[column] = float(cell.find("m:v", _NS).text)
+                rows.append([values.get(i) for i in range(max(values) + 1)] if values else [])
+            sheets[name] = rows
+    return sheets
+
+
+def _batches():
+    rows = [
+        {"BE_Date": datetime.date(2024, 3, 5), "BE_Number": "1234567", "Product": "ZINC OXIDE",
+         "Quantity": 1200, "Total_Value_INR": Decimal("258600.50"), "Remarks": None},
+        {"BE_Date": datetime.date(2024, 3, 6), "BE_Number": "0076543", "Product": "COPPER WIRE",
+         "Quantity": None, "Total_Value_INR": Decimal("119880.00"), "Remarks": 'a, "quoted" note'},
+        {"BE_Date": datetime.date(2024, 3, 7), "BE_Number": "7654321", "Product": "ZINC DUST",
+         "Quantity": 5, "Total_Value_INR": Decimal("0"), "Remarks": "ünïcode ₹"},
+    ]
+    return [rows[:2], [], rows[2:]]
+
+
+def test_xlsx_rows_and_text_columns(tmp_path):
+    path = str(tmp_path / "out.xlsx")
+    assert write_xlsx(iter(_batches()), path) == 3
+
+    sheet = _read_xlsx(path)["Data"]
+    assert sheet[0] == ["BE_Date", "BE_Number", "Product", "Quantity", "Total_Value_INR", "Remarks"]
+    assert sheet[1] == ["2024-03-05", "1234567", "ZINC OXIDE", 1200.0, 258600.5]
+    assert sheet[2][1] == "0076543"  # document numbers stay text, leading zeros kept
+    assert sheet[2][3] is None
+    assert len(sheet) == 4
+
+
+def test_xlsx_rolls_over_to_new_sheets(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "EXCEL_MAX_ROWS", 3)  # header + 2 data rows per sheet
+    batch = [{"Product": f"P{i}", "Value": i} for i in range(5)]
+    path = str(tmp_path / "split.xlsx")
+    assert write_xlsx([batch[:3], batch[3:]], path) == 5
+
+    sheets = _read_xlsx(path)
+    assert list(sheets) == ["Data", "Data 2", "Data 3"]
+    assert all(rows[0] == ["Product", "Value"] for rows in sheets.values())
+    assert [row[0] for rows in sheets.values() for row in rows[1:]] == ["P0", "P1", "P2", "P3", "P4"]
+    assert [len(rows) for rows in sheets.values()] == [3, 3, 2]
+
+
+def test_xlsx_without_rows_is_an_empty_workbook(tmp_path):
+    path = str(tmp_path / "empty.xlsx")
+    assert write_xlsx([[], []], path) == 0
+    assert _read_xlsx(path) == {"Data": []}
+
+
+def _expected_csv_rows():
+    header = ["BE_Date", "BE_Number", "Product", "Quantity", "Total_Value_INR", "Remarks"]
+    rows = [[str(v) if v is not None else "" for v in row.values()] for batch in _batches() for row in batch]
+    return [header] + rows
+
+
+@pytest.mark.parametrize("export_format", ["csv", "csv.gz"])
+def test_csv_round_trip(tmp_path, export_format):
+    path = str(tmp_path / f"out.{export_format}")
+    assert write_export(iter(_batches()), path, export_format) == 3
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    if export_format == "csv.gz":
+        raw = gzip.decompress(raw)
+    assert raw.startswith(b"\xef\xbb\xbf")  # BOM, so Excel picks UTF-8
+    assert list(csv.reader(io.StringIO(raw.decode("utf-8-sig"), newline=""))) == _expected_csv_rows()
+
+
+def test_csv_without_rows_is_empty(tmp_path):
+    path = str(tmp_path / "empty.csv")
+    assert write_csv([[]], path) == 0
+    with open(path, encoding="utf-8-sig") as f:
+        assert f.read() == ""
+
+
+def test_parquet_round_trip_keeps_types(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    pa = pytest.importorskip("pyarrow")
+    rows = [
+        {"BE_Date": datetime.date(2024, 3, 5), "Loaded_At": datetime.datetime(2024, 3, 5, 14, 30),
+         "BE_Number": 1234567, "Product": "ZINC OXIDE", "Quantity": 1200, "Total_Value_INR": Decimal("258600.50"),
+         "Is_Sample": False, "Remarks": None},
+        {"BE_Date": datetime.date(2024, 3, 6), "Loaded_At": datetime.datetime(2024, 3, 6, 9, 0),
+         "BE_Number": 7654321, "Product": "COPPER WIRE", "Quantity": None, "Total_Value_INR": Decimal("0"),
+         "Is_Sample": True, "Remarks": "urgent"},
+    ]
+    path = str(tmp_path / "out.parquet")
+    assert write_parquet([rows], path) == 2
+
+    table = pq.read_table(path)
+    assert dict(zip(table.schema.names, table.schema.types)) == {
+        "BE_Date": pa.date32(),
+        "Loaded_At": pa.timestamp("us"),
+        "BE_Number": pa.string(),
+        "Product": pa.string(),
+        "Quantity": pa.int64(),
+        "Total_Value_INR": pa.float64(),
+        "Is_Sample": pa.bool_(),
+        "Remarks": pa.string(),
+    }
+    assert table.to_pylist() == [
+        dict(row, BE_Number=str(row["BE_Number"]), Total_Value_INR=float(row["Total_Value_INR"])) for row in rows
+    ]
+
+
+def test_parquet_row_groups_are_exact(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    batches = [[{"Product": f"P{i}", "Value": float(i)} for i in range(start, start + 700)] for start in range(0, 3500, 700)]
+    path = str(tmp_path / "groups.parquet")
+    assert write_parquet(iter(batches), path, row_group_rows=1000) == 3500
+
+    metadata = pq.ParquetFile(path).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [1000, 1000, 1000, 500]
+    assert pq.read_table(path).column("Value").to_pylist() == [float(i) for i in range(3500)]
+
+
+def test_export_format_names_and_mimetypes():
+    assert normalize_export_format("CSV_GZ") == "csv.gz"
+    assert normalize_export_format(None) == "xlsx"
+    with pytest.raises(ValueError):
+        normalize_export_format("pdf")
+    assert export_mimetype("abc.csv.gz") == "application/gzip"
+    assert export_mimetype("abc.csv") == "text/csv"
+    assert export_mimetype("abc.txt") is None
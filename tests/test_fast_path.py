@@ -0,0 +1,63 @@
+import pytest
+
+
+def test_top_n_importers(query_agent):
+    llm_data, confidence = query_agent._detect_common_intent("Who are the top 10 zinc oxide importers in 2024?")
+    assert confidence == 1.0
+    sql = llm_data["sql_query"]
+    assert sql.startswith("WITH TopCompanies AS ( SELECT TOP 10 [Importer/Exporter_Name], SUM(Total_Value_INR) AS OverallValue FROM View_Clean_Imports")
+    assert "WHERE [Product] LIKE '%ZINCOXIDE%' AND BE_Date >= DATEFROMPARTS(2024, 1, 1) AND BE_Date < DATEFROMPARTS(2025, 1, 1)" in sql
+    assert "WHERE v.[Product] LIKE '%ZINCOXIDE%' AND v.BE_Date >= DATEFROMPARTS(2024, 1, 1)" in sql
+    assert llm_data["query_type"] == "analytical" and not llm_data["is_time_series"]
+    assert llm_data["chart_title"] == "Top 10 Zinc Oxide Importers by Value (2024)"
+
+
+def test_top_n_exporters_by_quantity_since_a_year(query_agent):
+    llm_data, confidence = query_agent._detect_common_intent("top 5 exporters of basmati rice by quantity since 2022")
+    assert confidence == 1.0
+    sql = llm_data["sql_query"]
+    assert "SELECT TOP 5 [Importer/Exporter_Name], SUM(QUANTITY_KG) AS OverallValue FROM View_Clean_Exports" in sql
+    assert "SB_Date >= DATEFROMPARTS(2022, 1, 1)" in sql and "SB_Date <" not in sql
+
+
+def test_total_value_last_year(query_agent):
+    llm_data, confidence = query_agent._detect_common_intent("What is the total value of copper imports last year")
+    assert confidence == 1.0
+    assert llm_data["sql_query"] == (
+        "SELECT SUM(Total_Value_INR) AS TotalValue_INR, SUM(QUANTITY_KG) AS TotalQuantity_KG, "
+        "SUM(Total_Value_INR) / NULLIF(SUM(QUANTITY_KG), 0) AS WeightedAvgPrice_INR "
+        "FROM View_Clean_Imports WHERE [Product] LIKE '%COPPER%' "
+        "AND BE_Date >= DATEFROMPARTS(YEAR(GETDATE()) - 1, 1, 1) AND BE_Date < DATEFROMPARTS(YEAR(GETDATE()), 1, 1)"
+    )
+
+
+def test_monthly_trend(query_agent):
+    llm_data, confidence = query_agent._detect_common_intent("show me the monthly trend of steel coil exports")
+    assert confidence == 1.0
+    assert llm_data["is_time_series"]
+    assert "FROM View_Clean_Exports WHERE [Product] LIKE '%STEELCOIL%' GROUP BY DATEFROMPARTS(YEAR(SB_Date), MONTH(SB_Date), 1)" in llm_data["sql_query"]
+
+
+@pytest.mark.parametrize("question", [
+    "compare zinc vs copper imports",
+    "what is the average price of zinc imports",
+    "top 10 zinc importers from china by port",
+    "how many shipments of zinc arrived by sea",
+    "top 10 zinc importers in 1995",
+    "hello there",
+])
+def test_other_questions_go_to_the_llm(query_agent, question):
+    llm_data, confidence = query_agent._detect_common_intent(question)
+    assert llm_data is None or confidence < query_agent.fast_path_min_confidence
+
+
+@pytest.mark.parametrize("question", [
+    "top 10 zinc and copper importers",       # two products
+    "top 500 zinc importers",                 # outside 1-100
+    "top 10 total value importers",           # generic words as the product
+    "top 10 grade 304 stainless steel sheet importers",
+])
+def test_doubtful_matches_score_below_the_threshold(query_agent, question):
+    llm_data, confidence = query_agent._detect_common_intent(question)
+    assert llm_data is not None
+    assert confidence < query_agent.fast_path_min_confidence
@@ -0,0 +1,50 @@
+import datetime
+from decimal import Decimal
+
+from formatting import format_rows
+
+
+def _format_rows_row_wise(rows, column_names):
+    """The cell-by-cell formatter format_rows() replaced."""
+    formatted_rows = []
+    for row in rows:
+        new_row_dict = {}
+        for i, val in enumerate(row):
+            col_name = column_names[i]
+            if isinstance(val, (datetime.date, datetime.datetime)):
+                new_row_dict[col_name] = val.strftime('%d-%b-%Y')
+            elif col_name in ('BE_Number', 'SB_Number') and val is not None:
+                try:
+                    new_row_dict[col_name] = f"{float(val):.0f}"
+                except (ValueError, TypeError):
+                    new_row_dict[col_name] = str(val)
+            else:
+                new_row_dict[col_name] = val
+        formatted_rows.append(new_row_dict)
+    return formatted_rows
+
+
+COLUMNS = ["BE_Date", "BE_Number", "Product", "Quantity", "Unit_Price", "Total_Value_INR", "Remarks", "SB_Number"]
+
+ROWS = [
+    (datetime.date(2024, 3, 5), Decimal("1234567"), "ZINC OXIDE", 1200, Decimal("215.50"), Decimal("258600.00"), None, None),
+    (datetime.datetime(2024, 3, 5, 14, 30), 7654321.0, "COPPER WIRE", None, 99.9, 119880.0, "urgent", "ABC-12"),
+    (None, None, None, 0, None, None, datetime.date(2023, 12, 31), 42),
+    (datetime.date(2023, 12, 31), "9876543", "ZINC DUST", 5, Decimal("0"), Decimal("0.00"), "", Decimal("3.7")),
+]
+
+
+def test_column_wise_output_matches_row_wise():
+    assert format_rows(ROWS, COLUMNS) == _format_rows_row_wise(ROWS, COLUMNS)
+
+
+def test_single_rows_and_empty_results_match():
+    for row in ROWS:
+        assert format_rows([row], COLUMNS) == _format_rows_row_wise([row], COLUMNS)
+    assert format_rows([], COLUMNS) == []
+
+
+def test_dates_can_be_kept_for_typed_exports():
+    row = format_rows(ROWS[:1], COLUMNS, format_dates=False)[0]
+    assert row["BE_Date"] == datetime.date(2024, 3, 5)
+    assert row["BE_Number"] == "1234567"
@@ -0,0 +1,61 @@
+import agent
+
+
+def test_filter_literals_are_bound(query_agent):
+    sql, params = query_agent._parameterize_sql(
+        "SELECT [Product], 'x' AS Tag FROM View_Clean_Imports"
+        " WHERE [Importer/Exporter_Name] = 'O''NEIL METALS' AND [Quantity] >= 1000"
+        " AND [BE_Date] >= DATEFROMPARTS(2024, 1, 1) AND [Unit_Price] BETWEEN 1.5 AND 20"
+    )
+    assert sql == (
+        "SELECT [Product], 'x' AS Tag FROM View_Clean_Imports"
+        " WHERE [Importer/Exporter_Name] = :p0 AND [Quantity] >= :p1"
+        " AND [BE_Date] >= DATEFROMPARTS(:p2, :p3, :p4) AND [Unit_Price] BETWEEN :p5 AND :p6"
+    )
+    assert params == {"p0": "O'NEIL METALS", "p1": 1000, "p2": 2024, "p3": 1, "p4": 1, "p5": 1.5, "p6": 20}
+
+
+def test_like_pattern_is_bound_with_its_wildcards(query_agent):
+    sql, params = query_agent._parameterize_sql("SELECT * FROM View_Clean_Imports WHERE [Product] LIKE '%ZINC%'")
+    assert sql == "SELECT * FROM View_Clean_Imports WHERE [Product] LIKE :p0"
+    assert params == {"p0": "%ZINC%"}
+
+
+def test_unicode_strings_and_select_list_stay_inline(query_agent):
+    sql, params = query_agent._parameterize_sql(
+        "SELECT YEAR([BE_Date]) AS Yr, SUM([Total_Value_INR]) / 10000000 AS Crores FROM View_Clean_Imports"
+        " WHERE [Product] LIKE N'%ZINC%' GROUP BY YEAR([BE_Date])"
+    )
+    assert ":p" not in sql and params == {}
+
+
+def test_top_n_becomes_a_parameter(query_agent):
+    sql, params = query_agent._parameterize_sql(
+        "SELECT TOP 10 [Importer/Exporter_Name], SUM([Total_Value_INR]) AS Total FROM View_Clean_Imports"
+        " WHERE [Product] LIKE '%ZINC%' GROUP BY [Importer/Exporter_Name] ORDER BY Total DESC"
+    )
+    assert sql.startswith("SELECT TOP (:p0) [Importer/Exporter_Name]")
+    assert params == {"p0": 10, "p1": "%ZINC%"}
+
+
+def test_products_share_one_statement_shape(query_agent):
+    for product in ("ZINC", "COPPER", "NICKEL"):
+        query_agent._parameterize_sql(f"SELECT TOP 5 * FROM View_Clean_Imports WHERE [Product] LIKE '%{product}%'")
+
+    stats = query_agent.get_plan_stats()
+    assert stats["executions"] == 3
+    assert stats["new_statements"] == 1
+    assert stats["distinct_statements"] == 1
+    assert stats["bound_literals"] == 6
+
+
+def test_tracked_shapes_are_capped(query_agent, monkeypatch):
+    monkeypatch.setattr(agent, "PLAN_SHAPES_TRACKED", 3)
+    columns = ["Product", "Quantity", "Unit_Price", "Total_Value_INR", "Product"]
+    for column in columns:
+        query_agent._parameterize_sql(f"SELECT * FROM View_Clean_Imports WHERE [{column}] = 'x'")
+
+    stats = query_agent.get_plan_stats()
+    assert stats["distinct_statements"] == 3
+    # [Product] fell out of the window, so its second run counts as new again
+    assert stats["new_statements"] == 5
@@ -0,0 +1,44 @@
+import threading
+import time
+
+import result_store
+from result_store import ResultStore
+
+
+def _rows(n, label):
+    return [{"Product": f"{label} {i}", "Value": i} for i in range(n)]
+
+
+def test_spilled_result_is_loaded_back(tmp_path):
+    store = ResultStore(max_bytes=1, spill_dir=str(tmp_path))
+    first = store.put(_rows(50, "ZINC"))
+    store.put(_rows(50, "COPPER"))  # pushes the first result out to disk
+    assert store.stats()["spills"] == 1
+
+    page = store.get_page(first, offset=10, limit=5)
+    assert page["total_rows"] == 50
+    assert [row["Value"] for row in page["rows"]] == [10, 11, 12, 13, 14]
+    assert store.stats()["disk_loads"] == 1
+
+
+def test_concurrent_reads_wait_for_the_disk_load(tmp_path, monkeypatch):
+    store = ResultStore(max_bytes=1, spill_dir=str(tmp_path))
+    first = store.put(_rows(50, "ZINC"))
+    store.put(_rows(50, "COPPER"))
+
+    load = result_store.pickle.load
+
+    def slow_load(f):
+        time.sleep(0.2)
+        return load(f)
+
+    monkeypatch.setattr(result_store.pickle, "load", slow_load)
+    pages = []
+    threads = [threading.Thread(target=lambda: pages.append(store.get_page(first))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(pages) == 5 and all(page is not None and page["total_rows"] == 50 for page in pages)
+    assert store.stats()["disk_loads"] == 1
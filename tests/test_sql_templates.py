@@ -0,0 +1,57 @@
+from sql_templates import SqlTemplateStore
+
+
+LLM_DATA = {"answer": "Here are the shipments.", "query_type": "data_pull", "is_time_series": False, "chart_title": None}
+
+
+def test_company_like_keeps_spaces():
+    store = SqlTemplateStore()
+    sql = "SELECT * FROM View_Clean_Imports WHERE [Importer/Exporter_Name] LIKE '%TATA STEEL%'"
+    assert store.learn("show shipments of tata steel", LLM_DATA, sql)
+
+    matched = store.match("show shipments of reliance industries")
+    assert matched is not None
+    assert matched["sql_query"] == "SELECT * FROM View_Clean_Imports WHERE [Importer/Exporter_Name] LIKE '%RELIANCE INDUSTRIES%'"
+
+
+def test_product_like_is_space_normalized():
+    store = SqlTemplateStore()
+    sql = "SELECT * FROM View_Clean_Imports WHERE [Product] LIKE '%ZINCOXIDE%'"
+    assert store.learn("show shipments of zinc oxide", LLM_DATA, sql)
+
+    matched = store.match("show shipments of copper wire")
+    assert matched is not None
+    assert matched["sql_query"] == "SELECT * FROM View_Clean_Imports WHERE [Product] LIKE '%COPPERWIRE%'"
+
+
+def test_top_and_year_from_the_question_become_slots():
+    store = SqlTemplateStore()
+    sql = ("SELECT TOP 5 [Importer/Exporter_Name] FROM View_Clean_Imports WHERE [Product] LIKE '%ZINC%'"
+           " AND [BE_Date] >= DATEFROMPARTS(2023, 1, 1) AND [BE_Date] < DATEFROMPARTS(2024, 1, 1)")
+    assert store.learn("top 5 zinc importers in 2023", LLM_DATA, sql)
+
+    matched = store.match("top 10 copper importers in 2022")
+    assert matched["sql_query"] == (
+        "SELECT TOP 10 [Importer/Exporter_Name] FROM View_Clean_Imports WHERE [Product] LIKE '%COPPER%'"
+        " AND [BE_Date] >= DATEFROMPARTS(2022, 1, 1) AND [BE_Date] < DATEFROMPARTS(2023, 1, 1)"
+    )
+
+
+def test_literals_not_in_the_question_are_not_learned():
+    store = SqlTemplateStore()
+    top_sql = "SELECT TOP 10 [Importer/Exporter_Name] FROM View_Clean_Imports WHERE [Product] LIKE '%ZINC%'"
+    assert store.learn("biggest zinc importers", LLM_DATA, top_sql) is None
+
+    year_sql = "SELECT * FROM View_Clean_Imports WHERE [Product] LIKE '%ZINC%' AND [BE_Date] >= '2023-01-01'"
+    assert store.learn("show zinc shipments", LLM_DATA, year_sql) is None
+    assert store.stats()["templates"] == 0
+
+
+def test_follow_up_questions_are_not_learned_or_matched():
+    store = SqlTemplateStore()
+    history = [{"role": "user", "content": "top 5 zinc importers in 2023"}]
+    sql = "SELECT * FROM View_Clean_Imports WHERE [Product] LIKE '%ZINC%'"
+    assert store.learn("show shipments of zinc", LLM_DATA, sql, history) is None
+    assert store.learn("show shipments of zinc", LLM_DATA, sql)
+    assert store.match("show shipments of copper", history) is None
+    assert store.match("show shipments of copper") is not None